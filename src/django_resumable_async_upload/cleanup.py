@@ -0,0 +1,276 @@
+import os
+import posixpath
+import re
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from django_resumable_async_upload.manifest import ChunkManifest
+from django_resumable_async_upload.states import get_upload_state_class
+from django_resumable_async_upload.storage import (
+    PRIVATE_FOLDER,
+    ResumableStorage,
+    get_local_path,
+    private_name,
+)
+
+# files kept in the chunk folder for an upload, by chunk mode
+UPLOAD_FILE = re.compile(
+    r"^(?P<upload>\d+_.+?)"
+    r"(?P<suffix>_part_\d+|\.manifest|\.manifest\.received|\.bitmap|\.data"
+    r"|\.multipart|\.parts|\.parts\.\d+|\.log|\.log\.lock)$"
+)
+# kinds of files only ever created for a partial upload, numbers replaced by N
+PARTIAL_UPLOAD_FILES = {
+    "_part_N",
+    ".manifest",
+    ".manifest.received",
+    ".bitmap",
+    ".multipart",
+    ".log.lock",
+}
+# a completed file can end with .data, .parts or .log as well, so these only belong
+# to an upload if one of the files created before them is there as well
+UPLOAD_FILE_COMPANIONS = {
+    ".data": {".bitmap"},
+    ".parts": {".multipart"},
+    ".parts.N": {".multipart", "_part_N"},
+    ".log": {".log.lock", ".manifest"},
+}
+# chunks spooled by ChunkUploadHandler by a worker that died while receiving them
+SPOOLED_CHUNK = re.compile(r"^tmp\w+\.upload")
+# folders of the sharded chunk layout, see ResumableFile.get_chunk_folder()
+SHARD_FOLDER = re.compile(r"^[0-9a-f]{2}$")
+UPLOAD_FOLDER = re.compile(r"^[0-9a-f]{40}$")
+# complete files being merged, see ResumableFile.get_assembly_dir()
+ASSEMBLY_FILE = re.compile(r"^\.resumable-\w+\.upload$")
+# finalization statuses and their locks, see finalizers.UploadStatus
+STATUS_FILE = re.compile(r"^[0-9a-f]{40}\.(json|lock)$")
+
+EvictionReport = namedtuple("EvictionReport", ["uploads", "files", "bytes"])
+
+
+def iter_folder(storage, folder):
+    """
+    Yields the name, size and modification timestamp of every file in folder.
+    Local folders are read with os.scandir, so they are never listed into memory.
+    """
+    path = get_local_path(storage, folder)
+    if path:
+        try:
+            entries = os.scandir(path)
+        except FileNotFoundError:
+            return
+        with entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    yield entry.name, stat.st_size, stat.st_mtime
+        return
+    try:
+        files = storage.listdir(folder)[1]
+    except (FileNotFoundError, OSError):
+        return
+    for file in files:
+        name = posixpath.join(folder, file)
+        yield file, storage.size(name), storage.get_modified_time(name).timestamp()
+
+
+def iter_subfolders(storage, folder):
+    """
+    Yields the names of the folders in folder.
+    """
+    path = get_local_path(storage, folder)
+    if path:
+        try:
+            entries = os.scandir(path)
+        except FileNotFoundError:
+            return
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield entry.name
+        return
+    try:
+        yield from storage.listdir(folder)[0]
+    except (FileNotFoundError, OSError):
+        return
+
+
+def iter_upload_folders(storage, chunk_folder):
+    """
+    Yields the folders of the uploads stored in the sharded layout.
+    """
+    for shard in iter_subfolders(storage, chunk_folder):
+        if SHARD_FOLDER.match(shard):
+            shard_folder = posixpath.join(chunk_folder, shard)
+            for upload in iter_subfolders(storage, shard_folder):
+                if UPLOAD_FOLDER.match(upload):
+                    yield posixpath.join(shard_folder, upload)
+
+
+def upload_key(file):
+    """
+    Returns the upload a file in the chunk folder may belong to and the kind of the file,
+    e.g. "_part_N" for chunks, or (None, None) if it is no upload file.
+    """
+    match = UPLOAD_FILE.match(file)
+    if match:
+        return match.group("upload"), re.sub(r"\d+$", "N", match.group("suffix"))
+    if SPOOLED_CHUNK.match(file):
+        return file, "_part_N"
+    return None, None
+
+
+def is_partial_upload(kinds):
+    """
+    Returns whether the files of these kinds belong to a partial upload.
+    """
+    return bool(PARTIAL_UPLOAD_FILES & kinds)
+
+
+def is_upload_file(kind, kinds):
+    """
+    Returns whether a file of this kind belongs to the upload with files of these kinds.
+    """
+    companions = UPLOAD_FILE_COMPANIONS.get(kind)
+    return companions is None or bool(companions & kinds)
+
+
+def delete_upload_state(storage, name, upload_id):
+    """
+    Deletes what the state backend recorded for an evicted upload,
+    unless it is the upload's manifest, which is deleted with its other files.
+    """
+    state_class = get_upload_state_class()
+    if not issubclass(state_class, ChunkManifest):
+        state_class(storage, name, upload_id).delete()
+
+
+def evict_stale_uploads(max_age=None, max_bytes=None, batch_size=100, dry_run=False):
+    """
+    Deletes the chunks and bookkeeping of partial uploads from the chunk folder,
+    stored in the flat as well as in the sharded layout.
+
+    Uploads without activity for max_age seconds are evicted first. If the remaining
+    uploads still take up more than max_bytes, the least recently active ones are
+    evicted until they fit. The defaults are ADMIN_RESUMABLE_GC_MAX_AGE and
+    ADMIN_RESUMABLE_GC_MAX_BYTES. The upload state of evicted uploads is deleted
+    from the state backend with them. Finalization statuses and files left behind
+    by merges in persistent storage older than max_age are deleted as well.
+
+    A .data, .parts or .log file only counts as part of a partial upload
+    if the files its chunk mode creates before it are there too, see
+    UPLOAD_FILE_COMPANIONS, so completed files with similar names are kept.
+
+    Only a summary per upload is kept in memory, and evicted uploads are deleted
+    in batches of batch_size, with one pass over the chunk folder per batch.
+    Uploads in the sharded layout are deleted by removing their own folder.
+
+    Returns an EvictionReport of the evicted uploads and the files and bytes reclaimed.
+    """
+    if max_age is None:
+        max_age = getattr(settings, "ADMIN_RESUMABLE_GC_MAX_AGE", 7 * 24 * 3600)
+    if max_bytes is None:
+        max_bytes = getattr(settings, "ADMIN_RESUMABLE_GC_MAX_BYTES", None)
+    storage = ResumableStorage().get_chunk_storage()
+    chunk_folder = getattr(settings, "ADMIN_RESUMABLE_CHUNK_FOLDER", "")
+    now = time.time()
+
+    # upload -> [last activity, bytes, {kind: [last activity, bytes]}], uploads in
+    # the flat layout are keyed by their file name prefix, sharded ones by their folder
+    uploads = {}
+    for file, size, mtime in iter_folder(storage, chunk_folder):
+        key, kind = upload_key(file)
+        if key is None:
+            continue
+        upload = uploads.setdefault(key, [0, 0, {}])
+        group = upload[2].setdefault(kind, [0, 0])
+        group[0] = max(group[0], mtime)
+        group[1] += size
+    for key, upload in list(uploads.items()):
+        kinds = set(upload[2])
+        if not is_partial_upload(kinds):
+            del uploads[key]
+            continue
+        for kind, (mtime, size) in upload[2].items():
+            if is_upload_file(kind, kinds):
+                upload[0] = max(upload[0], mtime)
+                upload[1] += size
+        # only the kinds are needed to find the files of the upload again
+        upload[2] = kinds
+    for folder in iter_upload_folders(storage, chunk_folder):
+        upload = uploads[folder] = [0, 0, None]
+        for file, size, mtime in iter_folder(storage, folder):
+            upload[0] = max(upload[0], mtime)
+            upload[1] += size
+
+    evicted = set()
+    stored_bytes = 0
+    for key, (last_activity, size, _) in uploads.items():
+        if now - last_activity > max_age:
+            evicted.add(key)
+        else:
+            stored_bytes += size
+    if max_bytes is not None and stored_bytes > max_bytes:
+        for key in sorted(
+            (key for key in uploads if key not in evicted),
+            key=lambda key: uploads[key][0],
+        ):
+            if stored_bytes <= max_bytes:
+                break
+            evicted.add(key)
+            stored_bytes -= uploads[key][1]
+
+    files = reclaimed = 0
+    evicted = sorted(evicted)
+    for start in range(0, len(evicted), batch_size):
+        batch = set(evicted[start : start + batch_size])
+        for file, size, _ in iter_folder(storage, chunk_folder):
+            key, kind = upload_key(file)
+            if key in batch and is_upload_file(kind, uploads[key][2]):
+                if not dry_run:
+                    storage.delete(posixpath.join(chunk_folder, file))
+                files += 1
+                reclaimed += size
+        for folder in batch:
+            if "/" not in folder:
+                if not dry_run:
+                    manifest = posixpath.join(chunk_folder, folder + ".manifest")
+                    delete_upload_state(storage, manifest, None)
+                continue
+            if not dry_run:
+                # the folder of a sharded upload is named by its upload id
+                delete_upload_state(storage, None, posixpath.basename(folder))
+            for file, size, _ in iter_folder(storage, folder):
+                if not dry_run:
+                    storage.delete(posixpath.join(folder, file))
+                files += 1
+                reclaimed += size
+            path = get_local_path(storage, folder)
+            if path and not dry_run:
+                try:
+                    os.rmdir(path)
+                except OSError:
+                    # a chunk arrived in the meantime
+                    pass
+
+    status_folder = private_name("status")
+    for file, size, mtime in iter_folder(storage, status_folder):
+        if STATUS_FILE.match(file) and now - mtime > max_age:
+            if not dry_run:
+                storage.delete(posixpath.join(status_folder, file))
+            files += 1
+            reclaimed += size
+
+    persistent_storage = ResumableStorage().get_persistent_storage()
+    if get_local_path(persistent_storage, PRIVATE_FOLDER):
+        for file, size, mtime in iter_folder(persistent_storage, PRIVATE_FOLDER):
+            if ASSEMBLY_FILE.match(file) and now - mtime > max_age:
+                if not dry_run:
+                    persistent_storage.delete(posixpath.join(PRIVATE_FOLDER, file))
+                files += 1
+                reclaimed += size
+
+    return EvictionReport(len(evicted), files, reclaimed)
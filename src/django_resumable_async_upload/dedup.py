@@ -0,0 +1,111 @@
+import hashlib
+import posixpath
+import re
+
+from django.conf import settings
+
+from django_resumable_async_upload.storage import (
+    ResumableStorage,
+    private_name,
+    replace_file,
+)
+from django_resumable_async_upload.validators import record_stored_file
+
+SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_enabled():
+    return getattr(settings, "ADMIN_RESUMABLE_DEDUP", False)
+
+
+class ContentIndex(object):
+    """
+    Maps the SHA-256 of files collected into persistent storage to their paths.
+
+    Every entry is a small file in the private "index" folder of chunk storage,
+    named by the hash and holding the path, so it is shared by all workers
+    like the upload statuses.
+    """
+
+    def __init__(self):
+        self.storage = ResumableStorage().get_chunk_storage()
+        self.folder = private_name("index")
+
+    def entry_name(self, sha256):
+        if not SHA256.match(sha256):
+            raise ValueError("Invalid SHA-256")
+        return posixpath.join(self.folder, sha256[:2], sha256)
+
+    def get(self, sha256):
+        """
+        Returns the path of the file with this content, or None.
+        """
+        try:
+            with self.storage.open(self.entry_name(sha256), "rb") as f:
+                return f.read().decode("utf-8")
+        except (FileNotFoundError, OSError):
+            return None
+
+    def add(self, sha256, path):
+        replace_file(self.storage, self.entry_name(sha256), path.encode("utf-8"))
+
+    def discard(self, sha256):
+        name = self.entry_name(sha256)
+        if self.storage.exists(name):
+            self.storage.delete(name)
+
+    def reference_name(self, path):
+        digest = hashlib.sha1(path.encode("utf-8")).hexdigest()
+        return posixpath.join(self.folder, "references", digest)
+
+    def add_reference(self, path):
+        """
+        Marks a stored file as handed out to another upload by reference.
+        """
+        replace_file(self.storage, self.reference_name(path), path.encode("utf-8"))
+
+    def is_referenced(self, path):
+        return self.storage.exists(self.reference_name(path))
+
+
+def is_shared(path):
+    """
+    Returns whether the stored file at path was handed out by reference,
+    so it may belong to several records and must not be deleted for one of them.
+    """
+    return ContentIndex().is_referenced(path)
+
+
+def find_duplicate(resumable_file, sha256):
+    """
+    Returns the path of a file in persistent storage with the content the client
+    announced with sha256 and the upload's size, or None if it has to be uploaded.
+
+    With the default "copy" ADMIN_RESUMABLE_DEDUP_MODE the stored file is copied
+    to the upload's own path, following the field's upload_to. With "reference"
+    the path of the stored file is returned, and the file is marked as shared,
+    see is_shared(). Index entries of files deleted or replaced in the meantime
+    are dropped.
+    """
+    sha256 = sha256.lower()
+    if not SHA256.match(sha256):
+        return None
+    index = ContentIndex()
+    path = index.get(sha256)
+    if path is None:
+        return None
+    storage = resumable_file.persistent_storage
+    try:
+        found = storage.exists(path) and storage.size(path) == resumable_file.total_size
+    except (FileNotFoundError, OSError):
+        found = False
+    if not found:
+        index.discard(sha256)
+        return None
+    if getattr(settings, "ADMIN_RESUMABLE_DEDUP_MODE", "copy") == "copy":
+        with storage.open(path, "rb") as f:
+            path = storage.save(resumable_file.storage_filename, f)
+    else:
+        index.add_reference(path)
+    record_stored_file(path, resumable_file.total_size)
+    return path
@@ -1,12 +1,171 @@
 # -*- coding: utf-8 -*-
+import errno
 import fnmatch
+import hashlib
+import io
+import os
+import posixpath
+import shutil
 import tempfile
+import zlib
 
+from django.core.exceptions import ImproperlyConfigured
 from django.core.files import File
+from django.core.files.uploadedfile import UploadedFile
 from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
 from django.conf import settings
 
-from django_resumable_async_upload.storage import ResumableStorage
+from django_resumable_async_upload import dedup
+from django_resumable_async_upload.manifest import LOCK_EX, locked_open
+from django_resumable_async_upload.states import get_upload_state_class
+from django_resumable_async_upload.storage import (
+    PRIVATE_FOLDER,
+    ResumableStorage,
+    get_local_path,
+)
+
+try:
+    import crc32c
+except ImportError:
+    crc32c = None
+
+# errors raised by copy_file_range/sendfile when the files can't be copied in the kernel
+KERNEL_COPY_UNSUPPORTED = {
+    errno.ENOSYS,
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOTSUP,
+    errno.EOPNOTSUPP,
+    errno.ENOTSOCK,
+    errno.EBADF,
+}
+
+
+def _kernel_copy_functions():
+    if hasattr(os, "copy_file_range"):
+        yield lambda in_fd, out_fd, offset, count: os.copy_file_range(
+            in_fd, out_fd, count, offset
+        )
+    if hasattr(os, "sendfile"):
+        yield lambda in_fd, out_fd, offset, count: os.sendfile(
+            out_fd, in_fd, offset, count
+        )
+
+
+def kernel_copy(infile, outfile):
+    """
+    Appends infile to outfile with os.copy_file_range or os.sendfile,
+    so the data is copied by the kernel without passing through Python buffers.
+    Returns False without copying anything if neither is supported for these files.
+    """
+    outfile.flush()
+    in_fd, out_fd = infile.fileno(), outfile.fileno()
+    size = os.fstat(in_fd).st_size
+    for copy in _kernel_copy_functions():
+        offset = 0
+        try:
+            while offset < size:
+                copied = copy(in_fd, out_fd, offset, size - offset)
+                if not copied:
+                    break
+                offset += copied
+        except OSError as e:
+            if offset == 0 and e.errno in KERNEL_COPY_UNSUPPORTED:
+                continue
+            raise
+        # the kernel advanced the descriptor, resync the file object's position
+        outfile.seek(0, os.SEEK_END)
+        return True
+    return False
+
+
+def file_sha256(file, buffer_size):
+    """
+    Returns the hex SHA-256 of file from its current position on, and rewinds it.
+    """
+    file_hash = hashlib.sha256()
+    for data in iter(lambda: file.read(buffer_size), b""):
+        file_hash.update(data)
+    file.seek(0)
+    return file_hash.hexdigest()
+
+
+class CRC32(object):
+    """
+    hashlib-like interface to a CRC32 function, zlib.crc32 by default.
+    """
+
+    def __init__(self, function=zlib.crc32):
+        self.function = function
+        self.value = 0
+
+    def update(self, data):
+        self.value = self.function(data, self.value)
+
+    def hexdigest(self):
+        return "%08x" % (self.value & 0xFFFFFFFF)
+
+
+# algorithms accepted for the resumableChunkChecksum param
+CHECKSUM_ALGORITHMS = {"md5": hashlib.md5, "crc32": CRC32}
+if crc32c is not None:
+    CHECKSUM_ALGORITHMS["crc32c"] = lambda: CRC32(crc32c.crc32c)
+
+
+class ChunkChecksumError(Exception):
+    """
+    Raised when a chunk doesn't match the checksum sent by the client.
+    """
+
+
+class UnsupportedChecksumError(ChunkChecksumError):
+    """
+    Raised when the client sent a checksum of an unknown algorithm.
+    """
+
+
+class ChecksumFile(File):
+    """
+    Updates a hash with all data read from the wrapped file.
+    """
+
+    def __init__(self, file, hash):
+        super().__init__(file, getattr(file, "name", None))
+        self.hash = hash
+
+    def read(self, *args):
+        data = self.file.read(*args)
+        self.hash.update(data)
+        return data
+
+
+class PeekableStream(object):
+    """
+    Stream whose first bytes can be looked at without consuming them,
+    e.g. a request body that is streamed into chunk storage afterwards.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = b""
+
+    def peek(self, size):
+        while len(self.buffer) < size:
+            data = self.stream.read(size - len(self.buffer))
+            if not data:
+                break
+            self.buffer += data
+        return self.buffer[:size]
+
+    def read(self, size=-1):
+        if not self.buffer:
+            return self.stream.read(size)
+        if size is None or size < 0:
+            data, self.buffer = self.buffer + self.stream.read(), b""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
 
 
 class ResumableFile(object):
@@ -25,7 +184,41 @@ class ResumableFile(object):
         self.user = user
         self.params = params
         self.chunk_suffix = "_part_"
-        self.chunk_folder = getattr(settings, "ADMIN_RESUMABLE_CHUNK_FOLDER", "")
+        self.manifest_suffix = ".manifest"
+        self.chunk_folder = self.get_chunk_folder()
+        self.buffer_size = getattr(settings, "ADMIN_RESUMABLE_BUFFER_SIZE", 64 * 1024)
+        self.zero_copy = getattr(settings, "ADMIN_RESUMABLE_ZERO_COPY", True)
+        # called with the number of bytes assembled so far while the file is merged
+        self.on_progress = None
+        # hex SHA-256 of the complete file, computed while it is assembled
+        # if ADMIN_RESUMABLE_FILE_HASH is enabled
+        self.sha256 = None
+
+    def get_chunk_folder(self):
+        """
+        Returns the folder the chunks of this upload are stored in.
+
+        With the "sharded" ADMIN_RESUMABLE_CHUNK_LAYOUT every upload gets its own folder,
+        named by its upload id and prefixed by the id's first two hex digits for fan-out.
+        """
+        chunk_folder = getattr(settings, "ADMIN_RESUMABLE_CHUNK_FOLDER", "")
+        if getattr(settings, "ADMIN_RESUMABLE_CHUNK_LAYOUT", "flat") == "sharded":
+            return posixpath.join(chunk_folder, self.upload_id[:2], self.upload_id)
+        return chunk_folder
+
+    def delete_chunk_folder(self):
+        """
+        Removes the upload's own folder in the sharded layout once it is empty.
+        """
+        if self.chunk_folder == getattr(settings, "ADMIN_RESUMABLE_CHUNK_FOLDER", ""):
+            return
+        path = get_local_path(self.chunk_storage, self.chunk_folder)
+        if path:
+            try:
+                os.rmdir(path)
+            except OSError:
+                # not empty or already removed
+                pass
 
     @cached_property
     def resumable_storage(self):
@@ -37,36 +230,128 @@ class ResumableFile(object):
 
     @cached_property
     def chunk_storage(self):
-        return ResumableStorage().get_chunk_storage()
+        return self.resumable_storage.get_chunk_storage()
 
     @property
     def storage_filename(self):
-        instance_id = self.params.get("instance_id")
-        if instance_id:
-            instance = self.field.model.objects.filter(pk=instance_id).first()
-        else:
-            instance = None
+        upload_to = self.upload_to
+        # only a callable upload_to is passed the instance
+        instance = self.get_instance() if callable(upload_to) else None
         return self.resumable_storage.full_filename(
-            self.filename, self.upload_to, instance=instance
+            self.filename, upload_to, instance=instance
         )
 
+    def get_instance(self):
+        """
+        Returns the instance the file is uploaded for, or None for new instances.
+
+        Only the fields named by the field's `upload_to_instance_fields`, or else
+        by an `instance_fields` attribute of the upload_to callable, are loaded.
+        If they are empty the instance isn't queried at all, only its pk is set.
+        """
+        instance_id = self.params.get("instance_id")
+        if not instance_id:
+            return None
+        fields = getattr(self.field, "upload_to_instance_fields", None)
+        if fields is None:
+            fields = getattr(self.upload_to, "instance_fields", None)
+        if fields is None:
+            return self.field.model.objects.filter(pk=instance_id).first()
+        if not fields:
+            return self.field.model(pk=self.field.model._meta.pk.to_python(instance_id))
+        return self.field.model.objects.filter(pk=instance_id).only(*fields).first()
+
     @property
     def upload_to(self):
         return self.field.upload_to
 
+    @cached_property
+    def upload_id(self):
+        """
+        Identifies this upload across requests, e.g. to report its finalization status.
+        """
+        key = "\n".join(
+            [
+                self.field.model._meta.label,
+                self.field.name,
+                str(getattr(self.user, "pk", "")),
+                self.params.get("resumableIdentifier", ""),
+                self.filename,
+            ]
+        )
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    @property
+    def total_size(self):
+        return int(self.params.get("resumableTotalSize"))
+
+    @property
+    def chunk_size(self):
+        return int(self.params.get("resumableChunkSize"))
+
+    @property
+    def total_chunks(self):
+        total_chunks = self.params.get("resumableTotalChunks")
+        if total_chunks:
+            return int(total_chunks)
+        # resumable.js adds the remainder to the last chunk
+        return max(self.total_size // self.chunk_size, 1)
+
+    def expected_chunk_size(self, number):
+        if number == self.total_chunks:
+            return self.total_size - (number - 1) * self.chunk_size
+        return self.chunk_size
+
     @property
     def chunk_exists(self):
         """
         Checks if the requested chunk exists.
         """
+        sizes = self.manifest.read()
+        if sizes is not None:
+            number = int(self.params.get("resumableChunkNumber"))
+            return sizes.get(number) == int(
+                self.params.get("resumableCurrentChunkSize")
+            )
         return self.chunk_storage.exists(
             self.current_chunk_name
         ) and self.chunk_storage.size(self.current_chunk_name) == int(
             self.params.get("resumableCurrentChunkSize")
         )
 
+    @property
+    def chunk_sizes(self):
+        """
+        Maps the number of every stored chunk to its size.
+        """
+        sizes = self.manifest.read()
+        if sizes is None:
+            # uploads started before manifests were written
+            sizes = {}
+            for chunk in self._scan_chunk_names():
+                number = int(chunk.rsplit(self.chunk_suffix, 1)[1])
+                sizes[number] = self.chunk_storage.size(chunk)
+        return sizes
+
+    @property
+    def received_chunks(self):
+        """
+        Numbers of the chunks stored with their expected size, in ascending order.
+        """
+        return sorted(
+            number
+            for number, size in self.chunk_sizes.items()
+            if number <= self.total_chunks and size == self.expected_chunk_size(number)
+        )
+
     @property
     def chunk_names(self):
+        """
+        Lists all stored chunks of this file in order.
+        """
+        return [self.chunk_name(number) for number in sorted(self.chunk_sizes)]
+
+    def _scan_chunk_names(self):
         """
         Iterates over all stored chunks in the configured chunk folder.
         """
@@ -84,30 +369,44 @@ class ResumableFile(object):
                     chunks.append(file)
         return chunks
 
-    @property
-    def current_chunk_name(self):
+    def chunk_name(self, number):
         # TODO: add user identifier to chunk name
         chunk_name = "%s%s%s" % (
             self.filename,
             self.chunk_suffix,
-            self.params.get("resumableChunkNumber").zfill(4),
+            str(number).zfill(4),
         )
         if self.chunk_folder:
             return "%s/%s" % (self.chunk_folder, chunk_name)
         return chunk_name
 
+    @property
+    def current_chunk_name(self):
+        return self.chunk_name(self.params.get("resumableChunkNumber"))
+
+    @cached_property
+    def manifest(self):
+        """
+        State of the upload kept by the ADMIN_RESUMABLE_STATE_BACKEND,
+        by default a manifest file next to the chunks.
+        """
+        name = "%s%s" % (self.filename, self.manifest_suffix)
+        if self.chunk_folder:
+            name = "%s/%s" % (self.chunk_folder, name)
+        return get_upload_state_class()(self.chunk_storage, name, self.upload_id)
+
     def chunks(self):
         """
         Iterates over all stored chunks.
         """
-        # TODO: add user identifier to chunk name
-        files = sorted(self.chunk_storage.listdir("")[1])
-        for file in files:
-            if fnmatch.fnmatch(file, "%s%s*" % (self.filename, self.chunk_suffix)):
-                yield self.chunk_storage.open(file, "rb").read()
+        for chunk in self.chunk_names:
+            with self.chunk_storage.open(chunk, "rb") as f:
+                yield f.read()
 
     def delete_chunks(self):
         [self.chunk_storage.delete(chunk) for chunk in self.chunk_names]
+        self.manifest.delete()
+        self.delete_chunk_folder()
 
     @property
     def file(self):
@@ -116,10 +415,165 @@ class ResumableFile(object):
         """
         if not self.is_complete:
             raise Exception("Chunk(s) still missing")
-        outfile = tempfile.NamedTemporaryFile("w+b")
-        for chunk in self.chunk_names:
-            outfile.write(self.chunk_storage.open(chunk).read())
-        return outfile
+        if self.total_chunks == 1:
+            return self.single_chunk_file()
+        outfile = tempfile.NamedTemporaryFile(
+            "w+b", prefix=".resumable-", suffix=".upload", dir=self.get_assembly_dir()
+        )
+        try:
+            self.assemble(outfile)
+        except BaseException:
+            outfile.close()
+            raise
+        outfile.seek(0)
+        return AssembledFile(outfile)
+
+    def get_assembly_dir(self):
+        """
+        Returns the directory complete files are merged in, the private folder
+        in the root of persistent storage if it is on the local filesystem.
+        FileSystemStorage then moves the merged file into place with a rename
+        instead of copying it once more, big files don't fill up the system's
+        temp dir, and files being merged are not served. Files left behind by
+        a worker that died are evicted by resumable_gc. Otherwise returns None
+        for the system's temp dir.
+        """
+        path = get_local_path(self.persistent_storage, PRIVATE_FOLDER)
+        if path:
+            os.makedirs(path, exist_ok=True)
+        return path
+
+    def single_chunk_file(self):
+        """
+        Returns the only chunk of a one-chunk upload as the complete file,
+        without merging it. A chunk on the local filesystem is a LocalFile, so FileSystemStorage
+        as persistent storage moves it into place with a rename.
+        """
+        chunk = self.chunk_name(1)
+        path = get_local_path(self.chunk_storage, chunk)
+        if path:
+            file = LocalFile(open(path, "rb"))
+        else:
+            file = self.chunk_storage.open(chunk, "rb")
+        if self.hash_file:
+            self.sha256 = file_sha256(file, self.buffer_size)
+        if self.on_progress:
+            self.on_progress(self.total_size)
+        return file
+
+    def _local_path(self, suffix, mode_name):
+        """
+        Returns the local path of the upload's file with suffix in the chunk folder,
+        for chunk modes that require a chunk storage on the local filesystem.
+        """
+        name = "%s%s" % (self.filename, suffix)
+        if self.chunk_folder:
+            name = "%s/%s" % (self.chunk_folder, name)
+        path = get_local_path(self.chunk_storage, name)
+        if not path:
+            raise ImproperlyConfigured(
+                "%s chunk mode requires a chunk storage on the local filesystem."
+                % mode_name
+            )
+        return path
+
+    def local_complete_file(self, path):
+        """
+        Flushes the complete file assembled in place at path to disk and returns it.
+        It is a LocalFile, so FileSystemStorage as persistent storage moves it
+        into place with a rename.
+        """
+        outfile = open(path, "rb")
+        os.fsync(outfile.fileno())
+        if self.hash_file:
+            # assembled in place, so the file is hashed once it is complete
+            self.sha256 = file_sha256(outfile, self.buffer_size)
+        return LocalFile(outfile)
+
+    def copy_local_file(self, path, outfile):
+        """
+        Copies the complete file assembled in place at path into outfile.
+        """
+        file_hash = hashlib.sha256() if self.hash_file else None
+        with open(path, "rb") as infile:
+            if file_hash:
+                infile = ChecksumFile(infile, file_hash)
+                shutil.copyfileobj(infile, outfile, self.buffer_size)
+                self.sha256 = file_hash.hexdigest()
+            elif not (self.zero_copy and kernel_copy(infile, outfile)):
+                shutil.copyfileobj(infile, outfile, self.buffer_size)
+
+    @property
+    def chunk_checksum(self):
+        """
+        Returns the algorithm and hex digest of the resumableChunkChecksum param,
+        e.g. "md5:0123...", or None if the client sent no checksum for the chunk.
+        """
+        value = self.params.get("resumableChunkChecksum")
+        if not value:
+            return None
+        algorithm, _, digest = value.partition(":")
+        algorithm = algorithm.strip().lower()
+        if algorithm not in CHECKSUM_ALGORITHMS or not digest:
+            raise UnsupportedChecksumError("Unsupported checksum %s" % algorithm)
+        return algorithm, digest.strip().lower()
+
+    def new_chunk_hash(self):
+        """
+        Returns a new hash of the algorithm of the chunk checksum, or None.
+        """
+        checksum = self.chunk_checksum
+        return CHECKSUM_ALGORITHMS[checksum[0]]() if checksum else None
+
+    def verify_chunk(self, digest):
+        """
+        Raises ChunkChecksumError if digest differs from the chunk checksum.
+        """
+        checksum = self.chunk_checksum
+        if checksum and digest != checksum[1]:
+            raise ChunkChecksumError(
+                "Chunk %s doesn't match its %s checksum"
+                % (self.params.get("resumableChunkNumber"), checksum[0])
+            )
+
+    @property
+    def hash_file(self):
+        # deduplication indexes collected files by their hash
+        return (
+            getattr(settings, "ADMIN_RESUMABLE_FILE_HASH", False) or dedup.is_enabled()
+        )
+
+    def assemble(self, outfile):
+        """
+        Streams all chunks in order into outfile.
+        Memory use is bounded by the buffer size, not by the chunk size.
+        Chunks stored on the local filesystem are copied by the kernel
+        if outfile is a real file as well, unless the SHA-256 of the file
+        is computed on the way.
+        """
+        file_hash = hashlib.sha256() if self.hash_file else None
+        zero_copy = not file_hash and self.zero_copy and hasattr(outfile, "fileno")
+        chunk_sizes = self.chunk_sizes
+        assembled = 0
+        for number in sorted(chunk_sizes):
+            chunk = self.chunk_name(number)
+            path = zero_copy and get_local_path(self.chunk_storage, chunk)
+            copied = False
+            if path:
+                with open(path, "rb") as infile:
+                    copied = kernel_copy(infile, outfile)
+                # not supported for these files, don't try again for the next chunks
+                zero_copy = copied
+            if not copied:
+                with self.chunk_storage.open(chunk, "rb") as infile:
+                    if file_hash:
+                        infile = ChecksumFile(infile, file_hash)
+                    shutil.copyfileobj(infile, outfile, self.buffer_size)
+            assembled += chunk_sizes[number]
+            if self.on_progress:
+                self.on_progress(assembled)
+        if file_hash:
+            self.sha256 = file_hash.hexdigest()
 
     @property
     def filename(self):
@@ -138,33 +592,389 @@ class ResumableFile(object):
         """
         Checks if all chunks are already stored.
         """
-        return int(self.params.get("resumableTotalSize")) == self.size
+        total_size = int(self.params.get("resumableTotalSize"))
+        received_size = self.received_size
+        if received_size > total_size:
+            # the counter drifted, e.g. after the same chunk was stored concurrently
+            received_size = self.size
+            self.manifest.reset_received(received_size)
+        elif received_size == total_size:
+            # confirm with the manifest before the chunks get merged
+            received_size = self.size
+        return total_size == received_size
 
     def process_chunk(self, file):
         """
         Saves chunk to chunk storage.
+
+        If the client sent a chunk checksum, it is verified against the digest
+        ChunkUploadHandler computed while spooling the chunk, or one computed while
+        the chunk is saved. Mismatching chunks are deleted again
+        and ChunkChecksumError is raised.
         """
+        chunk_hash = None
+        if self.chunk_checksum and getattr(file, "checksum", None) is None:
+            chunk_hash = self.new_chunk_hash()
+            file = ChecksumFile(file, chunk_hash)
+        replaced_size = 0
         if self.chunk_storage.exists(self.current_chunk_name):
+            replaced_size = self.chunk_storage.size(self.current_chunk_name)
             self.chunk_storage.delete(self.current_chunk_name)
-        self.chunk_storage.save(self.current_chunk_name, file)
+        name = self.chunk_storage.save(self.current_chunk_name, file)
+        if self.chunk_checksum:
+            try:
+                self.verify_chunk(
+                    chunk_hash.hexdigest() if chunk_hash else file.checksum
+                )
+            except ChunkChecksumError:
+                self.chunk_storage.delete(name)
+                raise
+        self.manifest.add(
+            int(self.params.get("resumableChunkNumber")),
+            self.chunk_storage.size(name),
+            replaced_size,
+        )
+
+    @property
+    def received_size(self):
+        """
+        Gets the number of bytes received so far from the running counter,
+        rescanning the stored chunks if the counter is missing.
+        """
+        received_size = self.manifest.received()
+        if received_size is None:
+            chunk_sizes = self.chunk_sizes
+            received_size = sum(chunk_sizes.values())
+            if chunk_sizes:
+                # not kept for uploads without chunks, e.g. ones collected already
+                self.manifest.reset_received(received_size)
+        return received_size
 
     @property
     def size(self):
         """
         Gets size of all chunks combined.
         """
-        size = 0
-        for chunk in self.chunk_names:
-            size += self.chunk_storage.size(chunk)
-        return size
+        return sum(self.chunk_sizes.values())
 
     def collect(self):
         """
         Saves the complete file to persistent storage and deletes chunks.
         Returns the actual filename in persistent storage.
+
+        The chunk of a one-chunk upload is saved as it is, see single_chunk_file().
         """
-        actual_filename = self.persistent_storage.save(
-            self.storage_filename, File(self.file)
-        )
+        file = self.file
+        if not isinstance(file, File):
+            file = File(file)
+        actual_filename = self.persistent_storage.save(self.storage_filename, file)
+        file.close()
         self.delete_chunks()
+        if self.sha256 and dedup.is_enabled():
+            dedup.ContentIndex().add(self.sha256, actual_filename)
         return actual_filename
+
+
+class LocalFile(File):
+    """
+    Complete file that already exists on the local filesystem.
+    Like TemporaryUploadedFile it exposes temporary_file_path(),
+    so FileSystemStorage moves it into place instead of copying it.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+class AssembledFile(LocalFile):
+    """
+    Complete file merged into a NamedTemporaryFile,
+    which is deleted on close unless it was moved into place.
+    """
+
+    def close(self):
+        try:
+            return self.file.close()
+        except FileNotFoundError:
+            # moved into place by FileSystemStorage, like TemporaryUploadedFile
+            pass
+
+
+class ChunkWriter(object):
+    """
+    Writes a chunk with os.pwrite into an open file, starting at offset.
+    At most limit bytes are written, so an oversized chunk cannot overwrite
+    the next one, but all received bytes are counted.
+    """
+
+    def __init__(self, fd, offset, limit=None):
+        self.fd = fd
+        self.offset = offset
+        self.limit = limit
+        self.written = 0
+        self.received = 0
+
+    def write(self, data):
+        self.received += len(data)
+        view = memoryview(data)
+        if self.limit is not None:
+            view = view[: max(self.limit - self.written, 0)]
+        while view:
+            written = os.pwrite(self.fd, view, self.offset + self.written)
+            view = view[written:]
+            self.written += written
+
+    def close(self):
+        os.close(self.fd)
+
+
+class WrittenChunk(UploadedFile):
+    """
+    Chunk that was written to its final place while the request was parsed.
+    It carries no content, only the number of bytes received.
+    """
+
+    def __init__(
+        self, name, content_type, size, charset, content_type_extra=None, checksum=None
+    ):
+        super().__init__(
+            io.BytesIO(), name, content_type, size, charset, content_type_extra
+        )
+        # hex digest of the chunk checksum algorithm, if the client sent a checksum
+        self.checksum = checksum
+
+
+class PreallocatedResumableFile(ResumableFile):
+    """
+    Writes every chunk directly at its offset into a single file
+    preallocated to the total size, instead of storing chunks as separate files.
+    Received chunks are tracked in a bitmap, so finishing an upload needs no merge,
+    only an fsync and handing the file to persistent storage.
+
+    Requires a chunk storage backed by the local filesystem.
+    """
+
+    def __init__(self, field, user, params):
+        super().__init__(field, user, params)
+        self.data_suffix = ".data"
+        self.bitmap_suffix = ".bitmap"
+
+    @cached_property
+    def data_path(self):
+        return self._local_path(self.data_suffix, "Preallocated")
+
+    @cached_property
+    def bitmap_path(self):
+        return self._local_path(self.bitmap_suffix, "Preallocated")
+
+    def _read_bitmap(self):
+        try:
+            with open(self.bitmap_path, "rb") as bitmap:
+                return bitmap.read()
+        except FileNotFoundError:
+            return b""
+
+    @property
+    def chunk_exists(self):
+        number = int(self.params.get("resumableChunkNumber"))
+        return number in self.chunk_sizes
+
+    @property
+    def chunk_sizes(self):
+        bitmap = self._read_bitmap()
+        return {
+            number: self.expected_chunk_size(number)
+            for number in range(1, self.total_chunks + 1)
+            if len(bitmap) > (number - 1) // 8
+            and bitmap[(number - 1) // 8] & (1 << ((number - 1) % 8))
+        }
+
+    @property
+    def chunk_names(self):
+        return []
+
+    @property
+    def received_size(self):
+        return self.size
+
+    @property
+    def is_complete(self):
+        return len(self.chunk_sizes) == self.total_chunks
+
+    def open_chunk(self):
+        """
+        Opens the preallocated file for writing the current chunk at its offset.
+        """
+        number = int(self.params.get("resumableChunkNumber"))
+        if not 0 < number <= self.total_chunks:
+            raise Exception("Invalid chunk number")
+        os.makedirs(os.path.dirname(self.data_path), exist_ok=True)
+        if not os.path.exists(self.data_path):
+            # created first, so cleanup never finds a data file without its bitmap
+            os.close(os.open(self.bitmap_path, os.O_WRONLY | os.O_CREAT, 0o644))
+        fd = os.open(self.data_path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(fd).st_size != self.total_size:
+            self._preallocate(fd)
+        return ChunkWriter(
+            fd, (number - 1) * self.chunk_size, self.expected_chunk_size(number)
+        )
+
+    def process_chunk(self, file):
+        """
+        Writes the chunk at its offset into the preallocated file
+        and marks it as received once all of its bytes are written.
+        """
+        if isinstance(file, WrittenChunk):
+            # already written by ChunkUploadHandler while the request was parsed
+            written = file.size
+            digest = file.checksum
+        else:
+            chunk_hash = self.new_chunk_hash()
+            writer = self.open_chunk()
+            try:
+                for data in file.chunks(self.buffer_size):
+                    writer.write(data)
+                    if chunk_hash:
+                        chunk_hash.update(data)
+            finally:
+                writer.close()
+            written = writer.received
+            digest = chunk_hash and chunk_hash.hexdigest()
+        # a mismatching chunk is not marked, it is overwritten when it is sent again
+        self.verify_chunk(digest)
+        number = int(self.params.get("resumableChunkNumber"))
+        if written == self.expected_chunk_size(number):
+            self._mark_received(number)
+
+    def _preallocate(self, fd):
+        try:
+            os.posix_fallocate(fd, 0, self.total_size)
+        except (AttributeError, OSError):
+            # not supported on this platform or filesystem, use a sparse file
+            os.ftruncate(fd, self.total_size)
+
+    def _mark_received(self, number):
+        index, bit = divmod(number - 1, 8)
+        with locked_open(self.bitmap_path, LOCK_EX) as fd:
+            os.lseek(fd, index, os.SEEK_SET)
+            byte = os.read(fd, 1) or b"\0"
+            os.lseek(fd, index, os.SEEK_SET)
+            os.write(fd, bytes([byte[0] | (1 << bit)]))
+
+    @property
+    def file(self):
+        """
+        Flushes the preallocated file to disk and returns it.
+        """
+        if not self.is_complete:
+            raise Exception("Chunk(s) still missing")
+        return self.local_complete_file(self.data_path)
+
+    def assemble(self, outfile):
+        self.copy_local_file(self.data_path, outfile)
+
+    def delete_chunks(self):
+        for path in (self.data_path, self.bitmap_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.delete_chunk_folder()
+
+
+class AppendResumableFile(ResumableFile):
+    """
+    Appends every chunk to a single log file as soon as it is next in sequence.
+    Chunks are stored as separate chunks first and appended by the request that
+    stored them, or, if they arrived out of order, by the one that fills the gap
+    before them. Appended chunks are deleted, so only few files are kept per upload,
+    and a complete upload is already assembled in the log.
+
+    Received chunks are recorded by the upload state as in the "parts" mode.
+    Requires a chunk storage backed by the local filesystem.
+    """
+
+    def __init__(self, field, user, params):
+        super().__init__(field, user, params)
+        self.log_suffix = ".log"
+        self.lock_suffix = ".log.lock"
+
+    @cached_property
+    def log_path(self):
+        return self._local_path(self.log_suffix, "Append")
+
+    @cached_property
+    def lock_path(self):
+        return self._local_path(self.lock_suffix, "Append")
+
+    def process_chunk(self, file):
+        super().process_chunk(file)
+        self.append_chunks()
+
+    def append_chunks(self):
+        """
+        Appends the stored chunks that are next in sequence to the log and deletes them.
+        Returns the number of chunks in the log.
+        """
+        with locked_open(self.lock_path, LOCK_EX):
+            fd = os.open(self.log_path, os.O_RDWR | os.O_CREAT, 0o644)
+            with os.fdopen(fd, "r+b") as log:
+                size = os.fstat(fd).st_size
+                if size >= self.total_size:
+                    appended = self.total_chunks
+                else:
+                    appended = min(size // self.chunk_size, self.total_chunks - 1)
+                    # drop the partial chunk of a request that died while appending it
+                    log.truncate(appended * self.chunk_size)
+                log.seek(0, os.SEEK_END)
+                chunk_sizes = self.chunk_sizes
+                while appended < self.total_chunks:
+                    number = appended + 1
+                    if chunk_sizes.get(number) != self.expected_chunk_size(number):
+                        break
+                    chunk = self.chunk_name(number)
+                    path = get_local_path(self.chunk_storage, chunk)
+                    with open(path, "rb") as infile:
+                        if not (self.zero_copy and kernel_copy(infile, log)):
+                            shutil.copyfileobj(infile, log, self.buffer_size)
+                    log.flush()
+                    appended = number
+                    self.chunk_storage.delete(chunk)
+        return appended
+
+    @property
+    def file(self):
+        """
+        Flushes the log to disk and returns it.
+        """
+        if not self.is_complete or self.append_chunks() < self.total_chunks:
+            raise Exception("Chunk(s) still missing")
+        return self.local_complete_file(self.log_path)
+
+    def assemble(self, outfile):
+        self.append_chunks()
+        self.copy_local_file(self.log_path, outfile)
+
+    def delete_chunks(self):
+        for path in (self.log_path, self.lock_path):
+            if os.path.exists(path):
+                os.remove(path)
+        super().delete_chunks()
+
+
+CHUNK_MODES = {
+    "parts": ResumableFile,
+    "preallocate": PreallocatedResumableFile,
+    "append": AppendResumableFile,
+    "multipart": "django_resumable_async_upload.s3.MultipartResumableFile",
+}
+
+
+def get_resumable_file_class():
+    """
+    Returns the ResumableFile class for ADMIN_RESUMABLE_CHUNK_MODE,
+    which is either one of the CHUNK_MODES or a dotted path to a ResumableFile subclass.
+    """
+    mode = getattr(settings, "ADMIN_RESUMABLE_CHUNK_MODE", "parts")
+    mode = CHUNK_MODES.get(mode, mode)
+    if isinstance(mode, str):
+        return import_string(mode)
+    return mode
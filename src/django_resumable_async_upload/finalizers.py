@@ -0,0 +1,265 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+from django_resumable_async_upload.manifest import LOCK_EX, locked_open
+from django_resumable_async_upload.storage import (
+    ResumableStorage,
+    get_local_path,
+    private_name,
+    replace_file,
+)
+from django_resumable_async_upload.validators import record_stored_file
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class FinalizationLock(object):
+    """
+    Held while an upload is finalized.
+
+    The request collecting an upload hands the path to the requests waiting
+    for the lock with finish(), so no status has to be kept for it.
+    On local chunk storage the path is written into the lock file, which stays
+    until resumable_gc evicts it, so every worker can read it. Otherwise it is
+    kept in the default cache, which is shared by all workers for the lock anyway.
+    """
+
+    def __init__(self, upload_id, fd=None):
+        self.key = "resumable-finalized-%s" % upload_id
+        self.fd = fd
+
+    @property
+    def result(self):
+        if self.fd is None:
+            return cache.get(self.key)
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        content = os.read(self.fd, 4096)
+        return content.decode("utf-8") if content else None
+
+    def finish(self, result):
+        if self.fd is None:
+            timeout = getattr(settings, "ADMIN_RESUMABLE_FINALIZE_LOCK_TIMEOUT", 3600)
+            cache.set(self.key, result, timeout)
+            return
+        os.ftruncate(self.fd, 0)
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        os.write(self.fd, result.encode("utf-8"))
+
+
+class UploadStatus(object):
+    """
+    Finalization status of an upload.
+
+    It is stored as a small JSON document in the private folder of chunk storage,
+    so it can be read by any worker process polling for it.
+    """
+
+    def __init__(self, upload_id):
+        self.upload_id = upload_id
+        self.storage = ResumableStorage().get_chunk_storage()
+        self.name = private_name("status", "%s.json" % upload_id)
+
+    def get(self):
+        """
+        Returns the stored status or None if the upload was never submitted.
+        """
+        try:
+            with self.storage.open(self.name, "rb") as f:
+                return json.loads(f.read().decode("utf-8"))
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+
+    def set(self, **data):
+        """
+        Updates the stored status with data and returns it.
+        """
+        status = self.get() or {"upload_id": self.upload_id}
+        status.update(data)
+        replace_file(self.storage, self.name, json.dumps(status).encode("utf-8"))
+        return status
+
+    def delete(self):
+        if self.storage.exists(self.name):
+            self.storage.delete(self.name)
+
+    @contextmanager
+    def lock(self):
+        """
+        Serializes the finalization of the upload across threads and worker processes.
+
+        On local chunk storage this is a flock on a lock file next to the status,
+        which also works across nodes sharing the chunk folder and is released
+        when a worker dies. Otherwise a key is added to the default cache,
+        which has to be shared by all workers (e.g. Redis or Memcached).
+        Yields the FinalizationLock.
+        """
+        path = get_local_path(self.storage, self.name[: -len(".json")] + ".lock")
+        if path:
+            with locked_open(path, LOCK_EX) as fd:
+                yield FinalizationLock(self.upload_id, fd)
+            return
+        key = "resumable-finalize-%s" % self.upload_id
+        timeout = getattr(settings, "ADMIN_RESUMABLE_FINALIZE_LOCK_TIMEOUT", 3600)
+        while not cache.add(key, True, timeout):
+            time.sleep(0.1)
+        try:
+            yield FinalizationLock(self.upload_id)
+        finally:
+            cache.delete(key)
+
+
+def run_finalization(resumable_file):
+    """
+    Collects a complete upload and records the progress and the result in its status.
+    """
+    status = UploadStatus(resumable_file.upload_id)
+    status.set(state=RUNNING, progress=0)
+    total_size = int(resumable_file.params.get("resumableTotalSize")) or 1
+    last_update = [time.monotonic()]
+
+    def on_progress(assembled):
+        # throttled, as uploads can consist of thousands of chunks
+        if time.monotonic() - last_update[0] >= 1:
+            last_update[0] = time.monotonic()
+            status.set(progress=assembled / total_size)
+
+    resumable_file.on_progress = on_progress
+    try:
+        path = resumable_file.collect()
+    except Exception as e:
+        logger.exception("Failed to finalize upload %s", resumable_file.upload_id)
+        return status.set(state=FAILED, error=str(e))
+    finally:
+        close_old_connections()
+    record_stored_file(path, resumable_file.total_size)
+    return status.set(state=DONE, progress=1, path=path, sha256=resumable_file.sha256)
+
+
+def collect_once(resumable_file):
+    """
+    Collects a complete upload and returns its path in persistent storage.
+
+    Several requests can see the same upload complete when its last chunks arrive
+    concurrently. Only the first one collects it, the others wait for it
+    and get the same path from the finalization lock. No status is stored.
+    """
+    status = UploadStatus(resumable_file.upload_id)
+    with status.lock() as lock:
+        if not resumable_file.is_complete:
+            # collected by another request while this one was waiting for the lock
+            path = lock.result
+            if path is None:
+                raise Exception("Upload was collected, but its path is unknown")
+            return path
+        path = resumable_file.collect()
+        record_stored_file(path, resumable_file.total_size)
+        lock.finish(path)
+    return path
+
+
+def finalize_upload(content_type_id, field_name, user_id, params):
+    """
+    Rebuilds a complete upload from the arguments returned by
+    BaseFinalizer.task_arguments() and finalizes it. Entry point for task queue workers.
+    """
+    from django_resumable_async_upload.files import get_resumable_file_class
+
+    field = (
+        ContentType.objects.get_for_id(content_type_id)
+        .model_class()
+        ._meta.get_field(field_name)
+    )
+    user = get_user_model().objects.filter(pk=user_id).first()
+    resumable_file = get_resumable_file_class()(field, user=user, params=params)
+    return run_finalization(resumable_file)
+
+
+class BaseFinalizer(object):
+    """
+    Finalizes complete uploads outside of the request that completed them.
+
+    Subclasses implement submit(). To use a task queue, submit a task with
+    the task_arguments() of the upload and call finalize_upload() in the task.
+    """
+
+    def submit(self, resumable_file):
+        raise NotImplementedError
+
+    def task_arguments(self, resumable_file):
+        return (
+            ContentType.objects.get_for_model(resumable_file.field.model).id,
+            resumable_file.field.name,
+            getattr(resumable_file.user, "pk", None),
+            dict(resumable_file.params.items()),
+        )
+
+
+class ThreadPoolFinalizer(BaseFinalizer):
+    """
+    Finalizes uploads in a thread pool shared by the worker process.
+    The number of threads is set with ADMIN_RESUMABLE_FINALIZER_THREADS.
+    """
+
+    executor = None
+
+    @classmethod
+    def get_executor(cls):
+        if cls.executor is None:
+            cls.executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "ADMIN_RESUMABLE_FINALIZER_THREADS", 2),
+                thread_name_prefix="resumable-finalizer",
+            )
+        return cls.executor
+
+    def submit(self, resumable_file):
+        return self.get_executor().submit(run_finalization, resumable_file)
+
+
+def get_finalizer():
+    finalizer_class = getattr(
+        settings,
+        "ADMIN_RESUMABLE_FINALIZER",
+        "django_resumable_async_upload.finalizers.ThreadPoolFinalizer",
+    )
+    return import_string(finalizer_class)()
+
+
+def submit_finalization(resumable_file):
+    """
+    Hands a complete upload to the configured finalizer unless it was submitted before.
+    Returns the status of the upload.
+    """
+    status = UploadStatus(resumable_file.upload_id)
+    with status.lock():
+        current = status.get()
+        if current and current["state"] in (PENDING, RUNNING):
+            return current
+        if current and not resumable_file.is_complete:
+            # finalized since this request saw it complete
+            return current
+        current = status.set(
+            state=PENDING,
+            progress=0,
+            user=getattr(resumable_file.user, "pk", None),
+            path=None,
+            sha256=None,
+            error=None,
+        )
+    get_finalizer().submit(resumable_file)
+    return current
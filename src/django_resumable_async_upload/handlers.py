@@ -0,0 +1,126 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+
+from django_resumable_async_upload.files import ChunkChecksumError, WrittenChunk
+from django_resumable_async_upload.storage import ResumableStorage, get_local_path
+from django_resumable_async_upload.validators import HEAD_SIZE
+
+
+class ChunkTemporaryUploadedFile(TemporaryUploadedFile):
+    """
+    TemporaryUploadedFile created in the given directory instead of FILE_UPLOAD_TEMP_DIR.
+    """
+
+    def __init__(
+        self, name, content_type, size, charset, content_type_extra=None, dir=None
+    ):
+        _, ext = os.path.splitext(name)
+        file = tempfile.NamedTemporaryFile(suffix=".upload" + ext, dir=dir)
+        super(TemporaryUploadedFile, self).__init__(
+            file, name, content_type, size, charset, content_type_extra
+        )
+
+
+class ChunkUploadHandler(FileUploadHandler):
+    """
+    Writes the uploaded chunk to disk exactly once.
+
+    If the ResumableFile of the request can write chunks in place (preallocate mode),
+    the data goes straight to its offset in the target file. Otherwise it is spooled
+    to a temporary file inside the chunk folder, which FileSystemStorage then moves
+    to the chunk's name with a rename instead of copying it from FILE_UPLOAD_TEMP_DIR.
+    A chunk written in place before is discarded instead of being overwritten.
+    If the client sent a chunk checksum, the chunk is hashed on the way.
+    The first bytes of the chunk are kept as `head` of the returned file for validation.
+    """
+
+    def __init__(self, request=None, resumable_file=None):
+        super().__init__(request)
+        self.resumable_file = resumable_file
+        self.writer = None
+        self.file = None
+        self.hash = None
+        self.head = b""
+
+    def get_temp_dir(self):
+        if self.resumable_file is not None:
+            chunk_folder = self.resumable_file.chunk_folder
+        else:
+            chunk_folder = getattr(settings, "ADMIN_RESUMABLE_CHUNK_FOLDER", "")
+        path = get_local_path(ResumableStorage().get_chunk_storage(), chunk_folder)
+        if not path:
+            # remote chunk storage, nothing to gain from spooling next to the chunks
+            return settings.FILE_UPLOAD_TEMP_DIR
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.writer = self.file = self.hash = None
+        self.head = b""
+        if self.field_name != "file":
+            # not a chunk, discarded
+            raise StopFutureHandlers()
+        open_chunk = getattr(self.resumable_file, "open_chunk", None)
+        if open_chunk and self.resumable_file.chunk_exists:
+            # already received, the view answers without touching the chunk
+            raise StopFutureHandlers()
+        if self.resumable_file is not None:
+            try:
+                self.hash = self.resumable_file.new_chunk_hash()
+            except ChunkChecksumError:
+                # rejected by the view once the request is parsed
+                pass
+        if open_chunk:
+            self.writer = open_chunk()
+        else:
+            self.file = ChunkTemporaryUploadedFile(
+                self.file_name,
+                self.content_type,
+                0,
+                self.charset,
+                self.content_type_extra,
+                dir=self.get_temp_dir(),
+            )
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.hash:
+            self.hash.update(raw_data)
+        if len(self.head) < HEAD_SIZE:
+            self.head += raw_data[: HEAD_SIZE - len(self.head)]
+        if self.writer:
+            self.writer.write(raw_data)
+        elif self.file:
+            self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        checksum = self.hash.hexdigest() if self.hash else None
+        if self.writer:
+            self.writer.close()
+            written_chunk = WrittenChunk(
+                self.file_name,
+                self.content_type,
+                self.writer.received,
+                self.charset,
+                self.content_type_extra,
+                checksum=checksum,
+            )
+            written_chunk.head = self.head
+            return written_chunk
+        if self.file:
+            self.file.seek(0)
+            self.file.size = file_size
+            self.file.checksum = checksum
+            self.file.head = self.head
+        return self.file
+
+    def upload_interrupted(self):
+        if self.writer:
+            self.writer.close()
+        elif self.file:
+            self.file.close()
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from django_resumable_async_upload.cleanup import evict_stale_uploads
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes the chunks of abandoned uploads from the chunk folder, "
+        "by age of their last activity and by a total byte budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-age",
+            type=int,
+            help="Evict uploads inactive for this many seconds "
+            "(default: ADMIN_RESUMABLE_GC_MAX_AGE).",
+        )
+        parser.add_argument(
+            "--max-bytes",
+            type=int,
+            help="Evict the least recently active uploads until the rest fit "
+            "into this many bytes (default: ADMIN_RESUMABLE_GC_MAX_BYTES).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of uploads deleted per pass over the chunk folder.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what would be evicted.",
+        )
+
+    def handle(self, *args, **options):
+        report = evict_stale_uploads(
+            max_age=options["max_age"],
+            max_bytes=options["max_bytes"],
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+        )
+        self.stdout.write(
+            "%s %d uploads: %d files, %d bytes reclaimed."
+            % (
+                "Would evict" if options["dry_run"] else "Evicted",
+                report.uploads,
+                report.files,
+                report.bytes,
+            )
+        )
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+
+    LOCK_EX, LOCK_SH, LOCK_NB = fcntl.LOCK_EX, fcntl.LOCK_SH, fcntl.LOCK_NB
+except ImportError:
+    # not available on Windows, bookkeeping updates are not serialized there
+    fcntl = None
+    LOCK_EX = LOCK_SH = LOCK_NB = None
+
+from django_resumable_async_upload.states import BaseUploadState
+from django_resumable_async_upload.storage import get_local_path
+
+
+@contextmanager
+def locked_open(path, operation):
+    """
+    Opens path for reading and writing, creating it if needed,
+    and holds a flock with the given operation (LOCK_EX or LOCK_SH) until closed.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl:
+            fcntl.flock(fd, operation)
+        yield fd
+    finally:
+        # closing the descriptor releases the lock
+        os.close(fd)
+
+
+class ChunkManifest(BaseUploadState):
+    """
+    Per-upload index of the chunks stored in chunk storage.
+
+    Every stored chunk adds a "<number> <size>" line to the manifest, so the chunks
+    of an upload can be listed without scanning the whole chunk folder.
+    A chunk that is stored again adds a new line which overrides the previous one.
+
+    Next to the manifest a running counter of received bytes is kept, so completeness
+    can be checked without reading the manifest or touching the stored chunks.
+    The counter is rebuilt from the manifest whenever it is missing.
+
+    Manifests are only kept for chunk storages backed by the local filesystem,
+    where appending a line is atomic. For other storages the manifest is never
+    written and callers fall back to listing the chunk folder.
+
+    This is the default ADMIN_RESUMABLE_STATE_BACKEND.
+    """
+
+    def __init__(self, storage, name, upload_id=None):
+        super().__init__(storage, name, upload_id)
+        self.path = get_local_path(storage, name)
+        self.counter_path = self.path and self.path + ".received"
+
+    def read(self):
+        """
+        Returns a dict mapping chunk numbers to chunk sizes,
+        or None if the manifest has not been written.
+        """
+        if not self.path:
+            return None
+        try:
+            with open(self.path, "rb") as manifest:
+                content = manifest.read()
+        except FileNotFoundError:
+            return None
+        sizes = {}
+        for line in content.decode("ascii", "ignore").splitlines():
+            try:
+                number, size = line.split()
+                sizes[int(number)] = int(size)
+            except ValueError:
+                # partially written line, the chunk will be uploaded again
+                continue
+        return sizes
+
+    def add(self, number, size, replaced_size=0):
+        """
+        Records a stored chunk and adds its size to the received bytes counter.
+        `replaced_size` is the size of a previously stored copy of the same chunk.
+        """
+        if not self.path:
+            return
+        # appends of a single line are atomic on local filesystems,
+        # so concurrent chunk requests cannot overwrite each other's entries
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, b"%d %d\n" % (number, size))
+        finally:
+            os.close(fd)
+        with locked_open(self.counter_path, LOCK_EX) as fd:
+            received = self._read_counter(fd)
+            if received is None:
+                # the manifest already contains this chunk
+                received = sum(self.read().values())
+            else:
+                received += size - replaced_size
+            self._write_counter(fd, received)
+
+    def received(self):
+        """
+        Returns the number of bytes received so far,
+        or None if the counter is missing and has to be rebuilt.
+        """
+        if not self.counter_path or not os.path.exists(self.counter_path):
+            return None
+        with locked_open(self.counter_path, LOCK_SH) as fd:
+            return self._read_counter(fd)
+
+    def reset_received(self, received):
+        """
+        Overwrites the received bytes counter, e.g. after rescanning the stored chunks.
+        """
+        if not self.counter_path:
+            return
+        with locked_open(self.counter_path, LOCK_EX) as fd:
+            self._write_counter(fd, received)
+
+    def _read_counter(self, fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        try:
+            return int(os.read(fd, 32))
+        except ValueError:
+            return None
+
+    def _write_counter(self, fd, received):
+        os.ftruncate(fd, 0)
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, b"%d" % received)
+
+    def delete(self):
+        for path in (self.path, self.counter_path):
+            if path and os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("django_resumable_async_upload", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="resumableupload",
+            name="name",
+            field=models.CharField(db_index=True, default="", max_length=255),
+        ),
+    ]
@@ -6,12 +6,15 @@ from django_resumable_async_upload.fields import FormResumableFileField
 class AsyncFileField(models.FileField):
     def __init__(self, *args, **kwargs):
         self.max_files = kwargs.pop("max_files", None)
+        self.upload_to_instance_fields = kwargs.pop("upload_to_instance_fields", None)
         super(AsyncFileField, self).__init__(*args, **kwargs)
 
     def deconstruct(self):
         name, path, args, kwargs = super(AsyncFileField, self).deconstruct()
         if self.max_files is not None:
             kwargs["max_files"] = self.max_files
+        if self.upload_to_instance_fields is not None:
+            kwargs["upload_to_instance_fields"] = self.upload_to_instance_fields
         return name, path, args, kwargs
 
     def formfield(self, **kwargs):
@@ -26,3 +29,38 @@ class AsyncFileField(models.FileField):
             )
         kwargs.update(defaults)
         return super(AsyncFileField, self).formfield(**kwargs)
+
+
+class ResumableUpload(models.Model):
+    """
+    Upload in progress, recorded by the ModelUploadState backend.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    upload_id = models.CharField(max_length=40, unique=True)
+    # name of the upload's manifest in chunk storage
+    name = models.CharField(max_length=255, db_index=True, default="")
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.upload_id
+
+
+class ResumableChunk(models.Model):
+    """
+    Chunk received for a ResumableUpload.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    upload = models.ForeignKey(
+        ResumableUpload, related_name="chunks", on_delete=models.CASCADE
+    )
+    number = models.PositiveIntegerField()
+    size = models.PositiveBigIntegerField()
+
+    class Meta:
+        unique_together = [("upload", "number")]
+
+    def __str__(self):
+        return "%s #%d" % (self.upload, self.number)
@@ -0,0 +1,63 @@
+import functools
+import operator
+import os
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def get_chunk_size():
+    """
+    Returns ADMIN_RESUMABLE_CHUNKSIZE in bytes. Like the widget,
+    it accepts a product such as "1*1024*1024" as well as a number.
+    """
+    chunk_size = getattr(settings, "ADMIN_RESUMABLE_CHUNKSIZE", "1*1024*1024")
+    if isinstance(chunk_size, str):
+        chunk_size = functools.reduce(
+            operator.mul, (int(factor) for factor in chunk_size.split("*"))
+        )
+    return int(chunk_size)
+
+
+class UploadPlanner(object):
+    """
+    Picks the chunk size and the number of simultaneous chunk uploads for a file
+    when the widget asks for an upload plan before sending any chunks.
+
+    The chunk size only depends on the file size, so an upload resumed later is
+    planned with the same chunks. It is ADMIN_RESUMABLE_CHUNKSIZE, grown in multiples
+    of it for files that would otherwise consist of more than ADMIN_RESUMABLE_MAX_CHUNKS
+    chunks, up to ADMIN_RESUMABLE_MAX_CHUNKSIZE.
+
+    The number of simultaneous uploads is ADMIN_SIMULTANEOUS_UPLOADS,
+    reduced while the load average exceeds the number of CPUs.
+    """
+
+    def chunk_size(self, total_size):
+        chunk_size = get_chunk_size()
+        max_chunks = getattr(settings, "ADMIN_RESUMABLE_MAX_CHUNKS", 1000)
+        max_chunk_size = getattr(
+            settings, "ADMIN_RESUMABLE_MAX_CHUNKSIZE", 64 * 1024 * 1024
+        )
+        multiple = max(-(-total_size // (chunk_size * max_chunks)), 1)
+        return max(min(chunk_size * multiple, max_chunk_size), chunk_size)
+
+    def simultaneous_uploads(self):
+        simultaneous_uploads = getattr(settings, "ADMIN_SIMULTANEOUS_UPLOADS", 3)
+        try:
+            load = os.getloadavg()[0] / (os.cpu_count() or 1)
+        except (AttributeError, OSError):
+            # load average is not available on Windows
+            return simultaneous_uploads
+        if load <= 1:
+            return simultaneous_uploads
+        return max(int(simultaneous_uploads / load), 1)
+
+
+def get_planner():
+    planner_class = getattr(
+        settings,
+        "ADMIN_RESUMABLE_PLANNER",
+        "django_resumable_async_upload.plans.UploadPlanner",
+    )
+    return import_string(planner_class)()
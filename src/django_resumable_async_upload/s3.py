@@ -0,0 +1,255 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.functional import cached_property
+
+from django_resumable_async_upload.files import ResumableFile
+from django_resumable_async_upload.manifest import LOCK_EX, LOCK_NB, locked_open
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+# S3 rejects parts smaller than this, except for the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class MultipartResumableFile(ResumableFile):
+    """
+    Passes chunks through to an S3 multipart upload instead of merging them on the server.
+
+    Consecutive chunks are grouped into parts of at least ADMIN_RESUMABLE_S3_PART_SIZE bytes.
+    As soon as all chunks of a part are stored it is sent with UploadPart and its chunks
+    are deleted, so finalizing the upload is a single CompleteMultipartUpload call.
+
+    The S3 client and bucket are taken from the persistent storage if it is a
+    django-storages S3Storage, otherwise from ADMIN_RESUMABLE_S3_BUCKET and
+    ADMIN_RESUMABLE_S3_ENDPOINT_URL. Requires boto3 and a chunk storage on the
+    local filesystem, which holds the chunks of incomplete parts and the bookkeeping.
+    """
+
+    def __init__(self, field, user, params):
+        super().__init__(field, user, params)
+        self.upload_suffix = ".multipart"
+        self.parts_suffix = ".parts"
+        self.part_size = max(
+            getattr(settings, "ADMIN_RESUMABLE_S3_PART_SIZE", MIN_PART_SIZE),
+            MIN_PART_SIZE,
+        )
+
+    @cached_property
+    def client(self):
+        connection = getattr(self.persistent_storage, "connection", None)
+        if connection is not None:
+            return connection.meta.client
+        if boto3 is None:
+            raise ImproperlyConfigured("Multipart chunk mode requires boto3.")
+        return boto3.client(
+            "s3",
+            endpoint_url=getattr(settings, "ADMIN_RESUMABLE_S3_ENDPOINT_URL", None),
+        )
+
+    @cached_property
+    def bucket(self):
+        bucket = getattr(self.persistent_storage, "bucket_name", None) or getattr(
+            settings, "ADMIN_RESUMABLE_S3_BUCKET", None
+        )
+        if not bucket:
+            raise ImproperlyConfigured(
+                "Multipart chunk mode requires an S3 persistent storage "
+                "or ADMIN_RESUMABLE_S3_BUCKET."
+            )
+        return bucket
+
+    @cached_property
+    def upload_path(self):
+        return self._local_path(self.upload_suffix, "Multipart")
+
+    @cached_property
+    def parts_path(self):
+        return self._local_path(self.parts_suffix, "Multipart")
+
+    @property
+    def chunks_per_part(self):
+        return max(-(-self.part_size // self.chunk_size), 1)
+
+    @property
+    def total_parts(self):
+        return -(-self.total_chunks // self.chunks_per_part)
+
+    def part_number(self, chunk_number):
+        return (chunk_number - 1) // self.chunks_per_part + 1
+
+    def part_chunk_numbers(self, part_number):
+        first = (part_number - 1) * self.chunks_per_part + 1
+        return range(first, min(first + self.chunks_per_part, self.total_chunks + 1))
+
+    def get_multipart_upload(self):
+        """
+        Returns the (upload id, key, name) of this file's multipart upload,
+        creating the upload if it doesn't exist yet.
+        """
+        with locked_open(self.upload_path, LOCK_EX) as fd:
+            content = os.read(fd, 4096).decode("utf-8")
+            if content:
+                return tuple(content.split("\n", 2))
+            name = self.persistent_storage.get_available_name(self.storage_filename)
+            normalize = getattr(self.persistent_storage, "_normalize_name", None)
+            key = normalize(name) if normalize else name
+            upload_id = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=key
+            )["UploadId"]
+            os.write(fd, ("%s\n%s\n%s" % (upload_id, key, name)).encode("utf-8"))
+            return upload_id, key, name
+
+    @property
+    def uploaded_parts(self):
+        """
+        Maps the numbers of the parts already sent to S3 to their ETags.
+        """
+        parts = {}
+        try:
+            with open(self.parts_path) as f:
+                for line in f:
+                    try:
+                        number, etag = line.split()
+                        parts[int(number)] = etag
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+        return parts
+
+    @property
+    def chunk_exists(self):
+        number = int(self.params.get("resumableChunkNumber"))
+        return super().chunk_exists or self.part_number(number) in self.uploaded_parts
+
+    def process_chunk(self, file):
+        """
+        Saves the chunk and sends its part to S3 once all chunks of the part are stored.
+        """
+        part_number = self.part_number(int(self.params.get("resumableChunkNumber")))
+        if part_number in self.uploaded_parts:
+            return
+        super().process_chunk(file)
+        if self.part_is_stored(part_number):
+            self.send_part(part_number, wait=False)
+
+    def part_is_stored(self, part_number):
+        """
+        Returns whether all chunks of the part are recorded with their expected size.
+        A chunk file alone can be a leftover of a request that broke off while
+        streaming it.
+        """
+        chunk_sizes = self.chunk_sizes
+        return all(
+            chunk_sizes.get(number) == self.expected_chunk_size(number)
+            for number in self.part_chunk_numbers(part_number)
+        )
+
+    def send_part(self, part_number, wait=True):
+        """
+        Sends the part unless it was sent already.
+
+        The part is claimed with a flock on its ".parts.<number>" file, so only one
+        of the requests completing it concurrently sends it. Without wait a part
+        claimed by another request is left to that request. The claim of a request
+        that died while sending the part is released with its flock.
+        """
+        claim = "%s.%d" % (self.parts_path, part_number)
+        operation = LOCK_EX
+        if not wait and LOCK_NB is not None:
+            operation |= LOCK_NB
+        try:
+            with locked_open(claim, operation):
+                if part_number not in self.uploaded_parts:
+                    self.upload_part(part_number)
+        except BlockingIOError:
+            # sent by the request holding the claim
+            pass
+
+    def upload_part(self, part_number):
+        if not self.part_is_stored(part_number):
+            # checked again under the claim, before the chunks are read
+            return
+        upload_id, key, _ = self.get_multipart_upload()
+        chunk_names = [self.chunk_name(n) for n in self.part_chunk_numbers(part_number)]
+        with tempfile.SpooledTemporaryFile(self.part_size + self.chunk_size) as body:
+            for chunk in chunk_names:
+                with self.chunk_storage.open(chunk, "rb") as infile:
+                    shutil.copyfileobj(infile, body, self.buffer_size)
+            size = body.tell()
+            body.seek(0)
+            etag = self.client.upload_part(
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=body,
+                ContentLength=size,
+            )["ETag"]
+        with open(self.parts_path, "a") as f:
+            f.write("%d %s\n" % (part_number, etag))
+        for chunk in chunk_names:
+            self.chunk_storage.delete(chunk)
+
+    @property
+    def file(self):
+        raise NotImplementedError("Multipart uploads are assembled by S3.")
+
+    def collect(self):
+        """
+        Sends any parts still missing and completes the multipart upload.
+        Returns the name of the complete file in persistent storage.
+        """
+        upload_id, key, name = self.get_multipart_upload()
+        parts = self.uploaded_parts
+        for part_number in range(1, self.total_parts + 1):
+            if part_number not in parts:
+                # waits for a request still sending the part
+                self.send_part(part_number)
+        parts = self.uploaded_parts
+        if len(parts) < self.total_parts:
+            raise Exception("Chunk(s) still missing")
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={
+                "Parts": [
+                    {"ETag": parts[number], "PartNumber": number}
+                    for number in sorted(parts)
+                ]
+            },
+        )
+        self.delete_chunks()
+        return name
+
+    def abort(self):
+        """
+        Aborts the multipart upload, e.g. when an incomplete upload is abandoned.
+        """
+        if os.path.exists(self.upload_path):
+            upload_id, key, _ = self.get_multipart_upload()
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id
+            )
+        self.delete_chunks()
+
+    def delete_chunks(self):
+        for chunk in self._scan_chunk_names():
+            self.chunk_storage.delete(chunk)
+        self.manifest.delete()
+        claims = [
+            "%s.%d" % (self.parts_path, n) for n in range(1, self.total_parts + 1)
+        ]
+        # the upload file is deleted last, the others only belong to it with it
+        for path in claims + [self.parts_path, self.upload_path]:
+            if os.path.exists(path):
+                os.remove(path)
+        self.delete_chunk_folder()
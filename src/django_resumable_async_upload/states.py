@@ -0,0 +1,159 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+from django.utils.module_loading import import_string
+
+
+class BaseUploadState(object):
+    """
+    Records the chunks received for an upload, so ResumableFile can answer
+    status questions without asking the chunk storage.
+
+    Implementations are created with the chunk storage, the name of the upload's
+    manifest in it and the upload id, and are selected with ADMIN_RESUMABLE_STATE_BACKEND.
+    To delete the state of an evicted upload, only one of name and upload id
+    may be known, the other is None.
+    """
+
+    def __init__(self, storage, name, upload_id):
+        self.storage = storage
+        self.name = name
+        self.upload_id = upload_id
+
+    def read(self):
+        """
+        Returns a dict mapping chunk numbers to chunk sizes,
+        or None if the chunk storage has to be scanned instead.
+        """
+        raise NotImplementedError
+
+    def add(self, number, size, replaced_size=0):
+        """
+        Records a stored chunk. `replaced_size` is the size of a previously
+        stored copy of the same chunk.
+        """
+        raise NotImplementedError
+
+    def received(self):
+        """
+        Returns the number of bytes received so far, or None if it is unknown.
+        """
+        sizes = self.read()
+        return None if sizes is None else sum(sizes.values())
+
+    def reset_received(self, received):
+        """
+        Overwrites the number of bytes received, if it is kept separately from the chunks.
+        """
+
+    def delete(self):
+        raise NotImplementedError
+
+
+class ModelUploadState(BaseUploadState):
+    """
+    Keeps the received chunks of uploads in the database,
+    in the ResumableUpload and ResumableChunk models.
+    """
+
+    def read(self):
+        from django_resumable_async_upload.models import ResumableChunk
+
+        return dict(
+            ResumableChunk.objects.filter(upload__upload_id=self.upload_id).values_list(
+                "number", "size"
+            )
+        )
+
+    def add(self, number, size, replaced_size=0):
+        from django_resumable_async_upload.models import ResumableChunk, ResumableUpload
+
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    upload, _ = ResumableUpload.objects.get_or_create(
+                        upload_id=self.upload_id, defaults={"name": self.name}
+                    )
+                    ResumableChunk.objects.update_or_create(
+                        upload=upload, number=number, defaults={"size": size}
+                    )
+                    # touched for resumable_gc and the like
+                    upload.save(update_fields=["updated"])
+                return
+            except IntegrityError:
+                # a concurrent request created the upload or the chunk first
+                if attempt:
+                    raise
+
+    def received(self):
+        from django_resumable_async_upload.models import ResumableChunk
+
+        return (
+            ResumableChunk.objects.filter(upload__upload_id=self.upload_id).aggregate(
+                received=Sum("size")
+            )["received"]
+            or 0
+        )
+
+    def delete(self):
+        from django_resumable_async_upload.models import ResumableUpload
+
+        if self.upload_id:
+            ResumableUpload.objects.filter(upload_id=self.upload_id).delete()
+        else:
+            ResumableUpload.objects.filter(name=self.name).delete()
+
+
+class CacheUploadState(BaseUploadState):
+    """
+    Keeps the received chunks of uploads in the Django cache named by
+    ADMIN_RESUMABLE_STATE_CACHE. The cache has to be shared by all workers
+    and must not evict entries before uploads are completed.
+    """
+
+    def __init__(self, storage, name, upload_id):
+        super().__init__(storage, name, upload_id)
+        self.cache = caches[getattr(settings, "ADMIN_RESUMABLE_STATE_CACHE", "default")]
+        # the upload id of the upload with this manifest name, to find it when evicted
+        self.name_key = (
+            "resumable-state-name-%s"
+            % hashlib.sha1((name or "").encode("utf-8")).hexdigest()
+        )
+        if upload_id is None:
+            upload_id = self.cache.get(self.name_key)
+        self.key = "resumable-state-%s" % upload_id
+        self.timeout = getattr(settings, "ADMIN_RESUMABLE_STATE_TIMEOUT", 7 * 24 * 3600)
+
+    def read(self):
+        return self.cache.get(self.key, {})
+
+    def add(self, number, size, replaced_size=0):
+        # the chunks are updated read-modify-write, so concurrent requests are serialized
+        lock = self.key + "-lock"
+        while not self.cache.add(lock, True, 10):
+            time.sleep(0.01)
+        try:
+            sizes = self.read()
+            if not sizes:
+                self.cache.set(self.name_key, self.upload_id, self.timeout)
+            sizes[number] = size
+            self.cache.set(self.key, sizes, self.timeout)
+        finally:
+            self.cache.delete(lock)
+
+    def delete(self):
+        self.cache.delete_many([self.key, self.name_key])
+
+
+def get_upload_state_class():
+    return import_string(
+        getattr(
+            settings,
+            "ADMIN_RESUMABLE_STATE_BACKEND",
+            "django_resumable_async_upload.manifest.ChunkManifest",
+        )
+    )
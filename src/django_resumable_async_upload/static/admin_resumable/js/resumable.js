@@ -48,6 +48,7 @@
       fileNameParameterName: 'resumableFilename',
       relativePathParameterName: 'resumableRelativePath',
       totalChunksParameterName: 'resumableTotalChunks',
+      contentHashParameterName: 'resumableSha256',
       dragOverClass: 'dragover',
       throttleProgressCallbacks: 0.5,
       query:{},
@@ -60,6 +61,8 @@
       prioritizeFirstAndLastChunk:false,
       target:'/',
       testTarget: null,
+      chunkStatusTarget: null,
+      planTarget: null,
       parameterNamespace:'',
       testChunks:true,
       generateUniqueIdentifier:null,
@@ -486,6 +489,7 @@
       $._pause = false;
       $.container = '';
       $.preprocessState = 0; // 0 = unprocessed, 1 = processing, 2 = finished
+      $.chunkStatusState = 0; // 0 = unknown, 1 = loading, 2 = loaded
       var _error = uniqueIdentifier !== undefined;
 
       // Callback when something happens within the chunk
@@ -550,18 +554,22 @@
           firedRetry = true;
         });
       };
-      $.bootstrap = function(){
-        $.abort();
-        _error = false;
-        // Rebuild stack of chunks from file
+      var createChunks = function(){
         $.chunks = [];
-        $._prevProgress = 0;
         var round = $.getOpt('forceChunkSize') ? Math.ceil : Math.floor;
         var maxOffset = Math.max(round($.file.size/$.getOpt('chunkSize')),1);
         for (var offset=0; offset<maxOffset; offset++) {(function(offset){
             $.chunks.push(new ResumableChunk($.resumableObj, $, offset, chunkEvent));
             $.resumableObj.fire('chunkingProgress',$,offset/maxOffset);
         })(offset)}
+      };
+      $.bootstrap = function(){
+        $.abort();
+        _error = false;
+        // Rebuild stack of chunks from file
+        $._prevProgress = 0;
+        $.chunkStatusState = 0;
+        createChunks();
         window.setTimeout(function(){
             $.resumableObj.fire('chunkingComplete',$);
         },0);
@@ -629,6 +637,13 @@
             case 2: break;
             }
           }
+          if ($.getOpt('planTarget') || ($.getOpt('testChunks') && $.getOpt('chunkStatusTarget'))) {
+            switch($.chunkStatusState) {
+            case 0: $.chunkStatusState = 1; $.loadChunkStatus(); return(true);
+            case 1: return(true);
+            case 2: break;
+            }
+          }
           $h.each($.chunks, function (chunk) {
             if (chunk.status() == 'pending' && chunk.preprocessState !== 1) {
               chunk.send();
@@ -639,6 +654,126 @@
         }
         return(found);
       };
+      // loadChunkStatus() asks chunkStatusTarget for all chunks stored in a previous session
+      // at once, instead of testing every chunk with a separate GET request.
+      // With planTarget, the server also picks the chunk size and the number of simultaneous uploads.
+      $.loadChunkStatus = function(){
+        var xhr = new XMLHttpRequest();
+        var loaded = function(){
+          var received = [];
+          if (xhr.status == 415) {
+            // rejected by the server's validators before any chunk is sent
+            var error = xhr.responseText;
+            try {
+              error = JSON.parse(xhr.responseText).error || error;
+            } catch (e) {}
+            $.chunkStatusState = 2;
+            chunkEvent('error', error);
+            $.resumableObj.uploadNextChunk();
+            return;
+          }
+          if (xhr.status == 200) {
+            var plan = {};
+            try {
+              plan = JSON.parse(xhr.responseText);
+            } catch (e) {
+              plan = {};
+            }
+            received = plan.received || [];
+            if (plan.upload_id) $.uploadId = plan.upload_id;
+            if (plan.path) {
+              // the server has the content already (see file.sha256), nothing to send
+              $h.each($.chunks, function(chunk){
+                chunk.tested = true;
+                chunk.markComplete = true;
+              });
+              $.chunkStatusState = 2;
+              $.resumableObj.fire('fileProgress', $);
+              $.resumableObj.fire('fileSuccess', $, plan.path);
+              $.resumableObj.uploadNextChunk();
+              return;
+            }
+            if (plan.chunk_size && plan.chunk_size != $.getOpt('chunkSize')) {
+              $.opts.chunkSize = plan.chunk_size;
+              createChunks();
+            }
+            if (plan.simultaneous_uploads) {
+              $.resumableObj.opts.simultaneousUploads = plan.simultaneous_uploads;
+            }
+            if (!$.getOpt('testChunks')) received = [];
+            var stored = [];
+            $h.each(received, function(range){
+              for (var number = range[0]; number <= range[1] && number <= $.chunks.length; number++) {
+                stored.push($.chunks[number - 1]);
+              }
+            });
+            // chunks that are not stored are sent right away
+            $h.each($.chunks, function(chunk){
+              chunk.tested = true;
+            });
+            $h.each(stored, function(chunk){
+              chunk.markComplete = true;
+            });
+            if (stored.length && stored.length == $.chunks.length) {
+              // test one stored chunk as usual, so the server finalizes the upload
+              var last = stored[stored.length - 1];
+              last.markComplete = false;
+              last.tested = false;
+            }
+          }
+          // on errors every chunk is tested separately
+          $.chunkStatusState = 2;
+          $.resumableObj.fire('fileProgress', $);
+          for (var num=1; num<=$.getOpt('simultaneousUploads'); num++) {
+            $.resumableObj.uploadNextChunk();
+          }
+        };
+        xhr.addEventListener('load', loaded, false);
+        xhr.addEventListener('error', loaded, false);
+        xhr.addEventListener('timeout', loaded, false);
+
+        var params = [];
+        var parameterNamespace = $.getOpt('parameterNamespace');
+        var customQuery = $.getOpt('query');
+        if(typeof customQuery == 'function') customQuery = customQuery($, null);
+        $h.each(customQuery, function(k,v){
+          params.push([encodeURIComponent(parameterNamespace+k), encodeURIComponent(v)].join('='));
+        });
+        params = params.concat(
+          [
+            ['chunkSizeParameterName', $.getOpt('chunkSize')],
+            ['totalSizeParameterName', $.size],
+            ['typeParameterName', $.file.type],
+            ['identifierParameterName', $.uniqueIdentifier],
+            ['fileNameParameterName', $.fileName],
+            ['relativePathParameterName', $.relativePath],
+            ['totalChunksParameterName', $.chunks.length],
+            // set by a preprocessFile hook hashing the file, for deduplication
+            ['contentHashParameterName', $.sha256]
+          ].filter(function(pair){
+            return $.getOpt(pair[0]) && (pair[0] != 'contentHashParameterName' || $.sha256);
+          })
+          .map(function(pair){
+            return [
+              parameterNamespace + $.getOpt(pair[0]),
+              encodeURIComponent(pair[1])
+            ].join('=');
+          })
+        );
+        var target = $.getOpt('planTarget') || $.getOpt('chunkStatusTarget');
+        var separator = target.indexOf('?') < 0 ? '?' : '&';
+        xhr.open($.getOpt('testMethod'), target + separator + params.join('&'));
+        xhr.timeout = $.getOpt('xhrTimeout');
+        xhr.withCredentials = $.getOpt('withCredentials');
+        var customHeaders = $.getOpt('headers');
+        if(typeof customHeaders === 'function') {
+          customHeaders = customHeaders($, null);
+        }
+        $h.each(customHeaders, function(k,v) {
+          xhr.setRequestHeader(k, v);
+        });
+        xhr.send(null);
+      };
       $.markChunksCompleted = function (chunkNumber) {
         if (!$.chunks || $.chunks.length <= chunkNumber) {
             return;
@@ -911,8 +1046,8 @@
           // Status is really 'OPENED', 'HEADERS_RECEIVED' or 'LOADING' - meaning that stuff is happening
           return('uploading');
         } else {
-          if($.xhr.status == 200 || $.xhr.status == 201) {
-            // HTTP 200, 201 (created)
+          if($.xhr.status == 200 || $.xhr.status == 201 || $.xhr.status == 202) {
+            // HTTP 200, 201 (created), 202 (accepted, finalized in the background)
             return('success');
           } else if($h.contains($.getOpt('permanentErrors'), $.xhr.status) || $.retries >= $.getOpt('maxChunkRetries')) {
             // HTTP 400, 404, 409, 415, 500, 501 (permanent error)
@@ -1,6 +1,7 @@
 import datetime
-
+import os
 import posixpath
+import tempfile
 
 try:
     from django.core.files.storage import storages, InvalidStorageError
@@ -10,8 +11,25 @@ except ImportError:
     InvalidStorageError = None
 
 from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.utils.encoding import force_str
 
+# storage instances shared by the process, keyed by kind and configured storage name
+_storages = {}
+
+# folder in the chunk folder with the library's own bookkeeping, apart from uploads
+PRIVATE_FOLDER = ".resumable"
+
+
+@receiver(setting_changed)
+def clear_storages(**kwargs):
+    """
+    Drops the shared storage instances, so they are resolved again with the new settings.
+    """
+    _storages.clear()
+
 
 class ResumableStorage(object):
     def __init__(self):
@@ -29,7 +47,17 @@ class ResumableStorage(object):
         Defaults to django.core.files.storage.FileSystemStorage.
         Chunk storage should be highly available for the server as saved chunks must be copied by the server
         for saving merged version in persistent storage.
+
+        Without arguments, the instance is created once and shared by the process.
         """
+        if args or kwargs:
+            return self._get_chunk_storage(*args, **kwargs)
+        key = ("chunk", self.chunk_storage_name)
+        if key not in _storages:
+            _storages[key] = self._get_chunk_storage()
+        return _storages[key]
+
+    def _get_chunk_storage(self, *args, **kwargs):
         if self.chunk_storage_name:
             # If a specific storage backend is configured, use it
             if storages:
@@ -69,7 +97,17 @@ class ResumableStorage(object):
         or DEFAULT_FILE_STORAGE if the former is not found.
 
         Defaults to django.core.files.storage.FileSystemStorage.
+
+        Without arguments, the instance is created once and shared by the process.
         """
+        if args or kwargs:
+            return self._get_persistent_storage(*args, **kwargs)
+        key = ("persistent", self.persistent_storage_name)
+        if key not in _storages:
+            _storages[key] = self._get_persistent_storage()
+        return _storages[key]
+
+    def _get_persistent_storage(self, *args, **kwargs):
         if storages:
             # Django 4.2+ with STORAGES setting
             if self.persistent_storage_name:
@@ -101,3 +139,41 @@ class ResumableStorage(object):
             dirname = force_str(datetime.datetime.now().strftime(force_str(upload_to)))
             filename = posixpath.join(dirname, filename)
         return self.get_persistent_storage().generate_filename(filename)
+
+
+def private_name(*parts):
+    """
+    Returns the name in chunk storage of a bookkeeping file like an upload status,
+    in the PRIVATE_FOLDER of ADMIN_RESUMABLE_CHUNK_FOLDER.
+    """
+    chunk_folder = getattr(settings, "ADMIN_RESUMABLE_CHUNK_FOLDER", "")
+    return posixpath.join(chunk_folder, PRIVATE_FOLDER, *parts)
+
+
+def get_local_path(storage, name):
+    """
+    Returns the local filesystem path of `name` in `storage`,
+    or None if the storage is not backed by the local filesystem.
+    """
+    try:
+        return storage.path(name)
+    except NotImplementedError:
+        return None
+
+
+def replace_file(storage, name, content):
+    """
+    Writes the bytes content to `name` in `storage`, replacing the existing file.
+    Local files are replaced atomically, so readers never see them partially written.
+    """
+    path = get_local_path(storage, name)
+    if path:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    else:
+        if storage.exists(name):
+            storage.delete(name)
+        storage.save(name, ContentFile(content))
@@ -4,4 +4,12 @@ from . import views
 
 urlpatterns = [
     path("upload/", views.admin_resumable, name="admin_resumable"),
+    path("upload/async/", views.admin_resumable_async, name="admin_resumable_async"),
+    path("upload/chunks/", views.admin_resumable_chunks, name="admin_resumable_chunks"),
+    path("upload/plan/", views.admin_resumable_plan, name="admin_resumable_plan"),
+    path(
+        "upload/status/<slug:upload_id>/",
+        views.admin_resumable_status,
+        name="admin_resumable_status",
+    ),
 ]
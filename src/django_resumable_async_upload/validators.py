@@ -1,8 +1,98 @@
-from django_resumable_async_upload.storage import ResumableStorage
+from django_resumable_async_upload.storage import ResumableStorage, get_local_path
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
 from os.path import splitext
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 
+# number of bytes at the start of a file sniff_content_type() looks at
+HEAD_SIZE = 262
+
+# (offset, magic bytes, content type) of common file formats
+MAGIC_NUMBERS = [
+    (0, b"%PDF-", "application/pdf"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"II*\x00", "image/tiff"),
+    (0, b"MM\x00*", "image/tiff"),
+    (0, b"PK\x03\x04", "application/zip"),
+    (0, b"PK\x05\x06", "application/zip"),
+    (0, b"\x1f\x8b", "application/gzip"),
+    (0, b"BZh", "application/x-bzip2"),
+    (0, b"\xfd7zXZ\x00", "application/x-xz"),
+    (0, b"7z\xbc\xaf\x27\x1c", "application/x-7z-compressed"),
+    (0, b"\x89HDF\r\n\x1a\n", "application/x-hdf5"),
+    (0, b"CDF\x01", "application/x-netcdf"),
+    (0, b"CDF\x02", "application/x-netcdf"),
+    (0, b"SQLite format 3\x00", "application/vnd.sqlite3"),
+    (0, b"\x7fELF", "application/x-executable"),
+    (0, b"MZ", "application/x-msdownload"),
+    (257, b"ustar", "application/x-tar"),
+    (4, b"ftyp", "video/mp4"),
+]
+
+
+def sniff_content_type(head):
+    """
+    Returns the content type of a file by the magic bytes at its start,
+    or "application/octet-stream" if it is not recognized.
+    """
+    for offset, magic, content_type in MAGIC_NUMBERS:
+        if head[offset : offset + len(magic)] == magic:
+            return content_type
+    return "application/octet-stream"
+
+
+def stored_file_key(name):
+    return "resumable-stored-%s" % hashlib.sha1(name.encode("utf-8")).hexdigest()
+
+
+def record_stored_file(name, size):
+    """
+    Remembers the size of a file just collected into persistent storage for
+    ADMIN_RESUMABLE_VALIDATION_CACHE_TIMEOUT seconds, so validating it
+    when the form is saved doesn't ask the storage again.
+    """
+    timeout = getattr(settings, "ADMIN_RESUMABLE_VALIDATION_CACHE_TIMEOUT", 600)
+    cache.set(stored_file_key(name), size, timeout)
+
+
+def forget_stored_file(name):
+    cache.delete(stored_file_key(name))
+
+
+def is_not_found(error):
+    # botocore's ClientError, without depending on it
+    code = getattr(error, "response", {}).get("Error", {}).get("Code")
+    return code in ("404", "NoSuchKey", "NotFound")
+
+
+def stored_size(storage, name):
+    """
+    Returns the size of name in storage, or None if it doesn't exist,
+    with a single metadata request instead of exists() followed by size().
+    """
+    path = get_local_path(storage, name)
+    if path:
+        try:
+            return os.stat(path).st_size
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+    try:
+        return storage.size(name)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        if is_not_found(e):
+            return None
+        raise
+
 
 class StorageFileValidator(object):
     """
@@ -11,6 +101,14 @@ class StorageFileValidator(object):
     Files uploaded using the library are passed to application with their names only.
     Any validation must happen either on the client-side or requires upload to be completed
     and file saved in application storage.
+
+    Used as a validator of an AsyncFileField, the upload views also apply its rules
+    with validate_upload() as soon as an upload is planned or its first chunk arrives,
+    so files that would be rejected are never uploaded completely.
+
+    Each file costs one metadata request, or none if it was just uploaded.
+    Lists of files, as cleaned by FormResumableMultipleFileField, are validated
+    in up to ADMIN_RESUMABLE_VALIDATION_THREADS threads.
     """
 
     messages = {
@@ -24,12 +122,19 @@ class StorageFileValidator(object):
         "max_size": _(
             "File {name} too large ({size} bytes). The maximum file size is {max_size} bytes."
         ),
+        "content_type": _(
+            "File {name} is of type {content_type}. Allowed types are: {allowed_types}"
+        ),
     }
 
-    def __init__(self, min_size=0, max_size=None, allowed_extensions=None):
+    def __init__(
+        self, min_size=0, max_size=None, allowed_extensions=None, allowed_types=None
+    ):
         self.min_size = min_size
         self.max_size = max_size
         self.allowed_extensions = allowed_extensions or []
+        # content types sniffed from the magic bytes, patterns like "image/*" are allowed
+        self.allowed_types = allowed_types or []
 
     def get_storage(self):
         return ResumableStorage().get_persistent_storage()
@@ -55,8 +160,10 @@ class StorageFileValidator(object):
             raise ValidationError(message)
 
     def validate_size(self, value, storage):
-        size = storage.size(value)
-        if size > self.max_size:
+        self.check_size(value, storage.size(value))
+
+    def check_size(self, value, size):
+        if self.max_size is not None and size > self.max_size:
             message = self.messages["max_size"].format(
                 **{
                     "name": value,
@@ -75,9 +182,69 @@ class StorageFileValidator(object):
             )
             raise ValidationError(message)
 
+    def validate_content_type(self, value, head):
+        content_type = sniff_content_type(head)
+        if self.allowed_types and not any(
+            fnmatch(content_type, allowed_type) for allowed_type in self.allowed_types
+        ):
+            message = self.messages["content_type"].format(
+                **{
+                    "name": value,
+                    "content_type": content_type,
+                    "allowed_types": ", ".join(self.allowed_types),
+                }
+            )
+            raise ValidationError(message)
+
+    def validate_upload(self, filename, size, head=None):
+        """
+        Checks an upload before it is complete, by the file name and total size
+        the client announced and, once the first chunk arrived, its first HEAD_SIZE bytes.
+        """
+        self.validate_extension(filename)
+        self.check_size(filename, size)
+        if head is not None:
+            self.validate_content_type(filename, head)
+
+    def validate(self, value, storage):
+        size = cache.get(stored_file_key(value))
+        if size is None:
+            size = stored_size(storage, value)
+        if size is None:
+            message = self.messages["file"].format(
+                **{
+                    "name": value,
+                }
+            )
+            raise ValidationError(message)
+        self.validate_extension(value)
+        self.check_size(value, size)
+        if self.allowed_types:
+            with storage.open(value, "rb") as f:
+                self.validate_content_type(value, f.read(HEAD_SIZE))
+
+    def validate_many(self, values, storage):
+        def validate(value):
+            try:
+                self.validate(value, storage)
+            except ValidationError as e:
+                return e
+            return None
+
+        threads = getattr(settings, "ADMIN_RESUMABLE_VALIDATION_THREADS", 8)
+        with ThreadPoolExecutor(max_workers=min(len(values), threads)) as executor:
+            errors = [error for error in executor.map(validate, values) if error]
+        if errors:
+            raise ValidationError(errors)
+
     def __call__(self, value):
-        assert type(value) == unicode
         storage = self.get_storage()
-        self.validate_exists(value, storage)
-        self.validate_extension(value)
-        self.validate_size(value, storage)
+        if isinstance(value, (list, tuple)):
+            values = [getattr(item, "name", item) for item in value]
+            if len(values) > 1:
+                return self.validate_many(values, storage)
+            value = values[0] if values else None
+        if not value:
+            return
+        # FieldFile when run as a model field validator
+        self.validate(getattr(value, "name", value), storage)
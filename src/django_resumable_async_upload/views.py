@@ -1,10 +1,37 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.contenttypes.models import ContentType
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.decorators import method_decorator
 from django.utils.functional import cached_property
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.views.generic import View
-from django_resumable_async_upload.files import ResumableFile
+from django_resumable_async_upload import dedup
+from django_resumable_async_upload.files import (
+    ChunkChecksumError,
+    PeekableStream,
+    UnsupportedChecksumError,
+    get_resumable_file_class,
+)
+from django_resumable_async_upload.handlers import ChunkUploadHandler
+from django_resumable_async_upload.plans import get_planner
+from django_resumable_async_upload.validators import HEAD_SIZE, forget_stored_file
+from django_resumable_async_upload.finalizers import (
+    DONE,
+    UploadStatus,
+    collect_once,
+    submit_finalization,
+)
+from django.core.exceptions import ValidationError
+from django.core.files import File
 from django.core.files.storage import default_storage
+from django.db import close_old_connections
 import json
 import logging
 
@@ -19,8 +46,15 @@ class UploadView(View):
 
     # inspired by another fork https://github.com/fdemmer/django-admin-resumable-js
 
+    @cached_property
+    def is_octet_stream(self):
+        return self.request.content_type == "application/octet-stream"
+
     @cached_property
     def request_data(self):
+        if self.is_octet_stream:
+            # the body is the raw chunk, resumable params are sent in the query string
+            return self.request.GET
         return getattr(self.request, self.request.method)
 
     @cached_property
@@ -32,28 +66,119 @@ class UploadView(View):
             self.request_data["field_name"]
         )
 
+    @method_decorator(csrf_exempt)
+    def dispatch(self, request, *args, **kwargs):
+        if request.method == "POST":
+            r = self.get_handler_resumable_file()
+            # the name and size rules are applied before the body is read,
+            # so a rejected upload never gets a chunk written or a file preallocated
+            error = r and self.validate_upload(r)
+            if error:
+                return HttpResponse(" ".join(error.messages), status=415)
+            if not self.is_octet_stream:
+                # upload handlers can only be replaced before CsrfViewMiddleware reads
+                # request.POST, so CSRF is checked here once they are installed
+                request.upload_handlers = [ChunkUploadHandler(request, r)]
+        return csrf_protect(super().dispatch)(request, *args, **kwargs)
+
+    def get_handler_resumable_file(self):
+        """
+        Builds the ResumableFile from the resumable params resumable.js also sends
+        in the query string, so the chunk can be written before the body is parsed.
+        """
+        params = self.request.GET
+        if not all(
+            params.get(key)
+            for key in (
+                "content_type_id",
+                "field_name",
+                "resumableChunkNumber",
+                "resumableTotalSize",
+                "resumableFilename",
+            )
+        ):
+            return None
+        content_type = ContentType.objects.get_for_id(params["content_type_id"])
+        field = content_type.model_class()._meta.get_field(params["field_name"])
+        return get_resumable_file_class()(field, user=self.request.user, params=params)
+
+    def validate_upload(self, r, head=None):
+        """
+        Applies the rules of the field's validators that implement validate_upload(),
+        like StorageFileValidator, to an upload that is not complete yet.
+        Returns the ValidationError if the upload is rejected.
+        """
+        for validator in r.field.validators:
+            validate_upload = getattr(validator, "validate_upload", None)
+            if validate_upload is None:
+                continue
+            try:
+                validate_upload(r.params.get("resumableFilename"), r.total_size, head)
+            except ValidationError as e:
+                return e
+        return None
+
     def post(self, request, *args, **kwargs):
-        chunk = request.FILES.get("file")
-        r = ResumableFile(
-            self.model_upload_field, user=request.user, params=request.POST
+        if self.is_octet_stream:
+            # streamed from the request into chunk storage without multipart parsing
+            stream = PeekableStream(request)
+            chunk = File(stream)
+        else:
+            chunk = request.FILES.get("file")
+        r = get_resumable_file_class()(
+            self.model_upload_field, user=request.user, params=self.request_data
         )
+        head = None
+        if r.params.get("resumableChunkNumber") == "1":
+            if self.is_octet_stream:
+                head = stream.peek(HEAD_SIZE)
+            else:
+                head = getattr(chunk, "head", None)
+        error = self.validate_upload(r, head)
+        if error:
+            # the chunk may be written in place already, and earlier chunks are useless
+            r.delete_chunks()
+            return HttpResponse(" ".join(error.messages), status=415)
         if not r.chunk_exists:
-            r.process_chunk(chunk)
+            try:
+                r.process_chunk(chunk)
+            except UnsupportedChecksumError as e:
+                return HttpResponse(str(e), status=400)
+            except ChunkChecksumError as e:
+                # not one of resumable.js' permanent errors, so the chunk is sent again
+                return HttpResponse(str(e), status=422)
         if r.is_complete:
-            file_path = r.collect()
-            return HttpResponse(file_path)
+            return self.finalize(r)
         return HttpResponse("chunk uploaded")
 
     def get(self, request, *args, **kwargs):
-        r = ResumableFile(
+        r = get_resumable_file_class()(
             self.model_upload_field, user=request.user, params=request.GET
         )
         if not r.chunk_exists:
             return HttpResponse("chunk not found", status=204)
         if r.is_complete:
-            return HttpResponse(r.collect())
+            return self.finalize(r)
         return HttpResponse("chunk exists")
 
+    def finalize(self, r):
+        """
+        Collects the complete file, or hands it to the background finalizer
+        and returns 202 with the URL to poll for its status.
+        """
+        if not getattr(settings, "ADMIN_RESUMABLE_BACKGROUND_FINALIZE", False):
+            return HttpResponse(collect_once(r))
+        status = submit_finalization(r)
+        if status["state"] == DONE:
+            return HttpResponse(status["path"])
+        return JsonResponse(
+            {
+                "upload_id": r.upload_id,
+                "status_url": reverse("admin_resumable_status", args=[r.upload_id]),
+            },
+            status=202,
+        )
+
     def delete(self, request, *args, **kwargs):
         """Handle file deletion via DELETE request."""
         file_path = None
@@ -65,9 +190,14 @@ class UploadView(View):
             if not file_path:
                 return JsonResponse({"error": "file_path required"}, status=400)
 
+            if dedup.is_shared(file_path):
+                # handed out by reference, so other records may still use it
+                return JsonResponse({"status": "success", "message": "File kept"})
+
             # Delete from storage
             if default_storage.exists(file_path):
                 default_storage.delete(file_path)
+            forget_stored_file(file_path)
             return JsonResponse({"status": "success", "message": "File removed"})
         except Exception as e:
             logger.error(f"Failed to delete file: {str(e)}")
@@ -76,4 +206,161 @@ class UploadView(View):
             )
 
 
+def chunk_ranges(numbers):
+    """
+    Compresses ascending chunk numbers into a list of inclusive [first, last] ranges.
+    """
+    ranges = []
+    for number in numbers:
+        if ranges and ranges[-1][1] == number - 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+    return ranges
+
+
+class UploadChunksView(UploadView):
+    """View listing the stored chunks of an upload in one request,
+    so a resumed upload can skip them instead of testing every chunk with a GET.
+    """
+
+    http_method_names = ["get"]
+
+    def get(self, request, *args, **kwargs):
+        r = get_resumable_file_class()(
+            self.model_upload_field, user=request.user, params=request.GET
+        )
+        return JsonResponse(
+            {
+                "total_chunks": r.total_chunks,
+                "received": chunk_ranges(r.received_chunks),
+            }
+        )
+
+
+class UploadPlanView(UploadView):
+    """View planning an upload before its first chunk is sent.
+    Returns the upload id, the chunk size and number of simultaneous uploads
+    picked by the planner, and the chunks stored by a previous session.
+    With deduplication, returns the path of the stored file instead if its
+    content is known by the resumableSha256 the client sent.
+    Uploads rejected by the field's validators are answered with 415.
+    """
+
+    http_method_names = ["get"]
+
+    def get(self, request, *args, **kwargs):
+        planner = get_planner()
+        total_size = int(request.GET["resumableTotalSize"])
+        chunk_size = planner.chunk_size(total_size)
+        params = request.GET.copy()
+        params["resumableChunkSize"] = str(chunk_size)
+        # like resumable.js, which merges the remainder into the last chunk
+        params["resumableTotalChunks"] = str(max(total_size // chunk_size, 1))
+        r = get_resumable_file_class()(
+            self.model_upload_field, user=request.user, params=params
+        )
+        error = self.validate_upload(r)
+        if error:
+            return JsonResponse({"error": " ".join(error.messages)}, status=415)
+        sha256 = request.GET.get("resumableSha256")
+        if sha256 and dedup.is_enabled():
+            path = dedup.find_duplicate(r, sha256)
+            if path:
+                # the content is stored already, nothing has to be sent
+                return JsonResponse({"upload_id": r.upload_id, "path": path})
+        return JsonResponse(
+            {
+                "upload_id": r.upload_id,
+                "chunk_size": chunk_size,
+                "simultaneous_uploads": planner.simultaneous_uploads(),
+                "total_chunks": r.total_chunks,
+                "received": chunk_ranges(r.received_chunks),
+            }
+        )
+
+
+class UploadStatusView(View):
+    """View reporting the finalization status of an upload finalized in the background."""
+
+    def get(self, request, upload_id, *args, **kwargs):
+        status = UploadStatus(upload_id).get()
+        if status is None or status.get("user") != request.user.pk:
+            raise Http404("Unknown upload")
+        return JsonResponse(
+            {
+                "upload_id": upload_id,
+                "state": status["state"],
+                "progress": status.get("progress"),
+                "path": status.get("path"),
+                "sha256": status.get("sha256"),
+                "error": status.get("error"),
+            }
+        )
+
+
+class AsyncUploadView(UploadView):
+    """Native async variant of UploadView for ASGI deployments.
+    Speaks the same protocol, but parses requests and does all blocking
+    storage and database I/O in a bounded thread pool, so the event loop
+    keeps serving other uploaders in the meantime.
+    """
+
+    executor = None
+
+    # the request body is already spooled by the ASGI handler,
+    # so keep Django's upload handlers and regular CSRF handling
+    dispatch = View.dispatch
+
+    @classmethod
+    def get_executor(cls):
+        if cls.executor is None:
+            cls.executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "ADMIN_RESUMABLE_ASYNC_THREADS", 8),
+                thread_name_prefix="resumable-upload",
+            )
+        return cls.executor
+
+    @classmethod
+    async def run_blocking(cls, func, *args, **kwargs):
+        def call():
+            try:
+                return func(*args, **kwargs)
+            finally:
+                close_old_connections()
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cls.get_executor(), call)
+
+    async def post(self, request, *args, **kwargs):
+        return await self.run_blocking(super().post, request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        return await self.run_blocking(super().get, request, *args, **kwargs)
+
+    async def delete(self, request, *args, **kwargs):
+        return await self.run_blocking(super().delete, request, *args, **kwargs)
+
+
+def async_login_required(view_func):
+    """
+    login_required for async views, which Django only supports from version 5.1.
+    """
+
+    @functools.wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        is_authenticated = await AsyncUploadView.run_blocking(
+            lambda: request.user.is_authenticated
+        )
+        if not is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view_func(request, *args, **kwargs)
+
+    return wrapper
+
+
 admin_resumable = login_required(UploadView.as_view())
+admin_resumable_async = async_login_required(AsyncUploadView.as_view())
+admin_resumable_chunks = login_required(UploadChunksView.as_view())
+admin_resumable_plan = login_required(UploadPlanView.as_view())
+admin_resumable_status = login_required(UploadStatusView.as_view())
@@ -4,6 +4,7 @@ from django.db.models.fields.files import FieldFile
 from django.forms import FileInput, CheckboxInput, forms
 from django.template import loader
 from django.templatetags.static import static
+from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy
 
@@ -38,8 +39,13 @@ class ResumableBaseWidget(FileInput):
         chunk_size = getattr(settings, "ADMIN_RESUMABLE_CHUNKSIZE", "1*1024*1024")
         show_thumb = getattr(settings, "ADMIN_RESUMABLE_SHOW_THUMB", False)
         simultaneous_uploads = getattr(settings, "ADMIN_SIMULTANEOUS_UPLOADS", 3)
+        upload_method = getattr(settings, "ADMIN_RESUMABLE_UPLOAD_METHOD", "multipart")
         media_url = getattr(settings, "MEDIA_URL", None)
         max_files = self.attrs.get("max_files", None)
+        if getattr(settings, "ADMIN_RESUMABLE_ASYNC_VIEW", False):
+            upload_url = reverse("admin_resumable_async")
+        else:
+            upload_url = reverse("admin_resumable")
 
         content_type_id = ContentType.objects.get_for_model(self.attrs["model"]).id
 
@@ -54,8 +60,11 @@ class ResumableBaseWidget(FileInput):
             "file_url": file_url,
             "file_name": file_name,
             "simultaneous_uploads": simultaneous_uploads,
+            "upload_method": upload_method,
             "max_files": max_files,
             "MEDIA_URL": media_url,
+            "upload_url": upload_url,
+            "plan_url": reverse("admin_resumable_plan"),
         }
 
         instance = self.attrs.get("instance")
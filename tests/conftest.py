@@ -11,6 +11,13 @@ def test_temp_dir(tmp_path_factory):
     return temp_dir
 
 
+@pytest.fixture
+def media_root(settings, tmp_path):
+    """Point MEDIA_ROOT, and with it chunk and persistent storage, to a fresh directory."""
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
 def pytest_configure():
     import django
     from django.conf import settings
@@ -0,0 +1,159 @@
+import os
+import time
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from django_resumable_async_upload.cleanup import evict_stale_uploads
+from django_resumable_async_upload.models import ResumableUpload
+
+from .test_files import make_resumable_file, upload_chunks
+
+
+def age(path, seconds):
+    for file in os.listdir(path.parent):
+        if file.startswith(path.name):
+            mtime = time.time() - seconds
+            os.utime(path.parent / file, (mtime, mtime))
+
+
+class TestEvictStaleUploads:
+    """Tests for evicting abandoned uploads from the chunk folder."""
+
+    def test_old_uploads_are_evicted(self, media_root):
+        upload_chunks(b"foo bar foo bar.", 5, [1, 2])
+        upload_chunks(b"new upload......", 5, [1], filename="new.bar")
+        age(media_root / "16_foo.bar", 3600)
+
+        report = evict_stale_uploads(max_age=60)
+
+        assert report.uploads == 1
+        assert report.files == 4
+        assert report.bytes == 10 + len("1 5\n2 5\n") + len("10")
+        assert sorted(os.listdir(media_root)) == [
+            "16_new.bar.manifest",
+            "16_new.bar.manifest.received",
+            "16_new.bar_part_0001",
+        ]
+
+    def test_least_recently_active_uploads_exceeding_budget_are_evicted(
+        self, media_root
+    ):
+        for number, filename in enumerate(["a.bar", "b.bar", "c.bar"]):
+            upload_chunks(b"foo bar foo bar.", 8, [1, 2], filename=filename)
+            age(media_root / ("16_" + filename), 100 - number)
+
+        report = evict_stale_uploads(max_age=3600, max_bytes=40, batch_size=1)
+
+        assert report.uploads == 2
+        assert sorted(file for file in os.listdir(media_root) if "_part_" in file) == [
+            "16_c.bar_part_0001",
+            "16_c.bar_part_0002",
+        ]
+
+    def test_completed_files_are_kept(self, media_root):
+        (media_root / "16_foo.bar").write_bytes(b"foo bar foo bar.")
+        (media_root / "16_foo.data").write_bytes(b"foo bar foo bar.")
+        age(media_root / "16_foo", 3600)
+
+        assert evict_stale_uploads(max_age=60) == (0, 0, 0)
+        assert sorted(os.listdir(media_root)) == ["16_foo.bar", "16_foo.data"]
+
+    def test_upload_files_are_recognized_by_their_group(self, media_root):
+        for name in [
+            "16_foo.bar.manifest.received",
+            "16_bar.bar.data",
+            "16_bar.bar.bitmap",
+            "16_baz.data",
+            "16_baz_part_0001",
+            "16_qux.parts",
+        ]:
+            (media_root / name).write_bytes(b"16")
+            age(media_root / name, 3600)
+
+        report = evict_stale_uploads(max_age=60)
+
+        assert report == (3, 4, 8)
+        assert sorted(os.listdir(media_root)) == ["16_baz.data", "16_qux.parts"]
+
+    def test_only_old_statuses_are_evicted(self, media_root):
+        status_folder = media_root / ".resumable" / "status"
+        status_folder.mkdir(parents=True)
+        for name in ["a" * 40 + ".json", "b" * 40 + ".lock", "report.json"]:
+            (status_folder / name).write_bytes(b"{}")
+            age(status_folder / name, 3600)
+        (status_folder / ("c" * 40 + ".json")).write_bytes(b"{}")
+
+        assert evict_stale_uploads(max_age=60) == (0, 2, 4)
+        assert sorted(os.listdir(status_folder)) == ["c" * 40 + ".json", "report.json"]
+
+    def test_stale_merges_are_evicted(self, media_root):
+        private_folder = media_root / ".resumable"
+        private_folder.mkdir()
+        for name in [".resumable-old.upload", ".resumable-new.upload"]:
+            (private_folder / name).write_bytes(b"foo bar foo bar.")
+        age(private_folder / ".resumable-old.upload", 3600)
+
+        assert evict_stale_uploads(max_age=60) == (0, 1, 16)
+        assert os.listdir(private_folder) == [".resumable-new.upload"]
+
+    def test_dry_run(self, media_root):
+        upload_chunks(b"foo bar foo bar.", 5, [1, 2])
+        age(media_root / "16_foo.bar", 3600)
+
+        assert evict_stale_uploads(max_age=60, dry_run=True).files == 4
+        assert len(os.listdir(media_root)) == 4
+
+    def test_command(self, media_root):
+        upload_chunks(b"foo bar foo bar.", 5, [1])
+        age(media_root / "16_foo.bar", 3600)
+        out = StringIO()
+
+        call_command("resumable_gc", "--max-age", "60", stdout=out)
+
+        assert out.getvalue() == "Evicted 1 uploads: 3 files, 10 bytes reclaimed.\n"
+        assert os.listdir(media_root) == []
+
+    def test_sharded_uploads_are_evicted(self, media_root, settings):
+        settings.ADMIN_RESUMABLE_CHUNK_LAYOUT = "sharded"
+        r = upload_chunks(b"foo bar foo bar.", 5, [1, 2])
+        age(media_root / r.chunk_folder / "16_foo", 3600)
+
+        report = evict_stale_uploads(max_age=60)
+
+        assert report == (1, 4, 10 + len("1 5\n2 5\n") + len("10"))
+        assert os.listdir(media_root / r.upload_id[:2]) == []
+
+    @pytest.mark.django_db
+    def test_database_state_is_evicted(self, media_root, settings):
+        settings.ADMIN_RESUMABLE_STATE_BACKEND = (
+            "django_resumable_async_upload.states.ModelUploadState"
+        )
+        upload_chunks(b"foo bar foo bar.", 5, [1, 2])
+        age(media_root / "16_foo.bar", 3600)
+
+        assert evict_stale_uploads(max_age=60) == (1, 2, 10)
+        assert not ResumableUpload.objects.exists()
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize("backend", ["ModelUploadState", "CacheUploadState"])
+    @pytest.mark.parametrize("layout", ["flat", "sharded"])
+    def test_state_of_uploads_over_budget_is_evicted(
+        self, media_root, settings, backend, layout
+    ):
+        settings.ADMIN_RESUMABLE_STATE_BACKEND = (
+            "django_resumable_async_upload.states." + backend
+        )
+        settings.ADMIN_RESUMABLE_CHUNK_LAYOUT = layout
+        data = b"foo bar foo bar."
+        upload_chunks(data, 5, [1, 2, 3])
+
+        assert evict_stale_uploads(max_bytes=0).uploads == 1
+
+        r, _ = make_resumable_file(data, 1, 5)
+        assert not r.chunk_exists
+        assert r.chunk_sizes == {}
+        assert not ResumableUpload.objects.exists()
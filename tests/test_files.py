@@ -0,0 +1,652 @@
+import errno
+import hashlib
+import os
+import zlib
+import tracemalloc
+
+import pytest
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+
+from django_resumable_async_upload import files
+from django_resumable_async_upload.files import (
+    ChunkChecksumError,
+    PreallocatedResumableFile,
+    UnsupportedChecksumError,
+    get_resumable_file_class,
+)
+
+from .models import Foo
+
+
+def make_resumable_file(data, chunk_number, chunk_size, filename="foo.bar", user=None):
+    total_chunks = max(1, -(-len(data) // chunk_size))
+    start = (chunk_number - 1) * chunk_size
+    end = len(data) if chunk_number == total_chunks else start + chunk_size
+    params = {
+        "resumableChunkNumber": str(chunk_number),
+        "resumableChunkSize": str(chunk_size),
+        "resumableCurrentChunkSize": str(end - start),
+        "resumableTotalSize": str(len(data)),
+        "resumableTotalChunks": str(total_chunks),
+        "resumableIdentifier": "%d-foobar" % len(data),
+        "resumableFilename": filename,
+    }
+    resumable_file_class = get_resumable_file_class()
+    r = resumable_file_class(Foo._meta.get_field("foo"), user=user, params=params)
+    return r, data[start:end]
+
+
+def upload_chunks(data, chunk_size, numbers, **kwargs):
+    for number in numbers:
+        r, chunk = make_resumable_file(data, number, chunk_size, **kwargs)
+        r.process_chunk(ContentFile(chunk))
+    return r
+
+
+class TestChunkManifest:
+    """Tests for the per-upload chunk manifest."""
+
+    def test_manifest_records_chunks(self, media_root):
+        data = b"foo bar foo bar."
+        r = upload_chunks(data, 5, [2, 1])
+
+        assert r.chunk_sizes == {1: 5, 2: 5}
+        assert r.chunk_names == ["16_foo.bar_part_0001", "16_foo.bar_part_0002"]
+        assert r.size == 10
+        assert not r.is_complete
+
+    def test_is_complete_after_all_chunks(self, media_root):
+        data = b"foo bar foo bar."
+        r = upload_chunks(data, 5, [1, 3, 2, 4])
+
+        assert r.is_complete
+        with r.file as outfile:
+            outfile.seek(0)
+            assert outfile.read() == data
+
+    def test_chunk_names_ignore_other_uploads(self, media_root, monkeypatch):
+        upload_chunks(b"other upload....", 5, [1, 2], filename="other.bar")
+        r = upload_chunks(b"foo bar foo bar.", 5, [1])
+
+        def listdir(*args, **kwargs):
+            raise AssertionError("chunk folder must not be listed")
+
+        monkeypatch.setattr(r.chunk_storage, "listdir", listdir)
+        assert r.chunk_names == ["16_foo.bar_part_0001"]
+
+    def test_reuploaded_chunk_overrides_entry(self, media_root):
+        data = b"foo bar foo bar."
+        r, chunk = make_resumable_file(data, 1, 5)
+        r.process_chunk(ContentFile(chunk[:2]))
+        r.process_chunk(ContentFile(chunk))
+
+        assert r.chunk_sizes == {1: 5}
+
+    def test_legacy_chunks_without_manifest(self, media_root):
+        data = b"foo bar foo bar."
+        r = upload_chunks(data, 5, [1, 2, 3, 4])
+        r.manifest.delete()
+
+        assert r.chunk_sizes == {1: 5, 2: 5, 3: 5, 4: 1}
+        assert r.is_complete
+
+    def test_delete_chunks_removes_manifest(self, media_root):
+        r = upload_chunks(b"foo bar foo bar.", 5, [1, 2])
+        r.delete_chunks()
+
+        assert os.listdir(media_root) == []
+
+
+class TestReceivedBytesCounter:
+    """Tests for the running received bytes counter."""
+
+    def test_counter_tracks_received_bytes(self, media_root):
+        data = b"foo bar foo bar."
+        r = upload_chunks(data, 5, [1, 2])
+
+        assert r.manifest.received() == 10
+        assert r.received_size == 10
+
+    def test_is_complete_does_not_stat_chunks(self, media_root, monkeypatch):
+        data = b"foo bar foo bar."
+        r = upload_chunks(data, 5, [1, 2, 3])
+
+        def size(*args, **kwargs):
+            raise AssertionError("chunks must not be stat-ed")
+
+        monkeypatch.setattr(r.chunk_storage, "size", size)
+        assert not r.is_complete
+
+    def test_reuploaded_chunk_is_counted_once(self, media_root):
+        data = b"foo bar foo bar."
+        upload_chunks(data, 5, [1, 2])
+        r = upload_chunks(data, 5, [2, 3, 4])
+
+        assert r.manifest.received() == 16
+        assert r.is_complete
+
+    def test_lost_counter_is_rebuilt(self, media_root):
+        data = b"foo bar foo bar."
+        r = upload_chunks(data, 5, [1, 2, 3])
+        os.remove(r.manifest.counter_path)
+
+        assert r.manifest.received() is None
+        assert not r.is_complete
+        assert r.manifest.received() == 15
+
+        r = upload_chunks(data, 5, [4])
+        assert r.is_complete
+
+    @pytest.mark.parametrize("layout", ["flat", "sharded"])
+    def test_counter_is_not_recreated_after_collect(self, media_root, settings, layout):
+        settings.ADMIN_RESUMABLE_CHUNK_LAYOUT = layout
+        data = b"foo bar foo bar."
+        r = upload_chunks(data, 5, [1, 2, 3, 4])
+        filename = r.collect()
+
+        assert not make_resumable_file(data, 4, 5)[0].is_complete
+        assert os.path.exists(media_root / filename)
+        # in the sharded layout only the empty shard folder is left
+        assert not any(
+            files for _, _, files in os.walk(media_root) if files != [filename]
+        )
+        if r.chunk_folder:
+            assert not os.path.exists(media_root / r.chunk_folder)
+
+    def test_drifted_counter_is_rebuilt(self, media_root):
+        data = b"foo bar foo bar."
+        r = upload_chunks(data, 5, [1, 2])
+        r.manifest.reset_received(100)
+
+        assert not r.is_complete
+        assert r.manifest.received() == 10
+
+
+class TestAssembly:
+    """Tests for merging stored chunks into the complete file."""
+
+    def test_assembly_memory_is_bounded_by_buffer(self, media_root, settings):
+        settings.ADMIN_RESUMABLE_BUFFER_SIZE = 64 * 1024
+        chunk_size = 4 * 1024 * 1024
+        data = os.urandom(2 * chunk_size)
+        r = upload_chunks(data, chunk_size, [1, 2])
+        del data
+
+        tracemalloc.start()
+        try:
+            outfile = r.file
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert peak < chunk_size / 4
+        assert os.path.getsize(outfile.name) == 2 * chunk_size
+        outfile.close()
+
+    def test_assembly_closes_chunk_files(self, media_root, settings, monkeypatch):
+        settings.ADMIN_RESUMABLE_ZERO_COPY = False
+        data = b"foo bar foo bar."
+        r = upload_chunks(data, 5, [1, 2, 3, 4])
+        opened = []
+        storage_open = r.chunk_storage.open
+
+        def open_chunk(*args, **kwargs):
+            opened.append(storage_open(*args, **kwargs))
+            return opened[-1]
+
+        monkeypatch.setattr(r.chunk_storage, "open", open_chunk)
+        with r.file as outfile:
+            assert outfile.read() == data
+
+        assert len(opened) == 4
+        assert all(f.closed for f in opened)
+
+    def test_local_chunks_are_merged_in_kernel(self, media_root, monkeypatch):
+        data = os.urandom(300 * 1024)
+        r = upload_chunks(data, 100 * 1024, [1, 2, 3])
+
+        def copyfileobj(*args, **kwargs):
+            raise AssertionError("chunks must not be copied through Python")
+
+        monkeypatch.setattr(files.shutil, "copyfileobj", copyfileobj)
+        with r.file as outfile:
+            assert outfile.read() == data
+
+    def test_merge_falls_back_to_streaming_copy(self, media_root, monkeypatch):
+        data = os.urandom(300 * 1024)
+        r = upload_chunks(data, 100 * 1024, [1, 2, 3])
+
+        def unsupported(*args, **kwargs):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+        monkeypatch.setattr(files.os, "copy_file_range", unsupported, raising=False)
+        monkeypatch.setattr(files.os, "sendfile", unsupported, raising=False)
+        with r.file as outfile:
+            assert outfile.read() == data
+
+    def test_merge_without_zero_copy(self, media_root, settings, monkeypatch):
+        settings.ADMIN_RESUMABLE_ZERO_COPY = False
+        data = os.urandom(300 * 1024)
+        r = upload_chunks(data, 100 * 1024, [1, 2, 3])
+
+        def kernel_copy(*args, **kwargs):
+            raise AssertionError("zero copy is disabled")
+
+        monkeypatch.setattr(files, "kernel_copy", kernel_copy)
+        with r.file as outfile:
+            assert outfile.read() == data
+
+
+class TestRenameFinalize:
+    """Tests for merging files next to their final place in persistent storage."""
+
+    def test_merged_file_is_moved_into_place(self, media_root, monkeypatch):
+        (media_root / "16_foo.bar").write_bytes(b"other")
+        r = upload_chunks(b"foo bar foo bar.", 5, [1, 2, 3, 4])
+        named_temporary_file = files.tempfile.NamedTemporaryFile
+        inodes = []
+
+        def record_inode(*args, **kwargs):
+            f = named_temporary_file(*args, **kwargs)
+            inodes.append(os.fstat(f.fileno()).st_ino)
+            assert os.path.dirname(f.name) == str(media_root / ".resumable")
+            return f
+
+        monkeypatch.setattr(files.tempfile, "NamedTemporaryFile", record_inode)
+        filename = r.collect()
+
+        assert filename.startswith("16_foo") and filename != "16_foo.bar"
+        assert (media_root / filename).read_bytes() == b"foo bar foo bar."
+        assert os.stat(media_root / filename).st_ino == inodes[0]
+        assert sorted(os.listdir(media_root)) == sorted(
+            [".resumable", "16_foo.bar", filename]
+        )
+
+    def test_failed_merge_leaves_no_file(self, media_root, monkeypatch):
+        r = upload_chunks(b"foo bar foo bar.", 5, [1, 2, 3, 4])
+
+        def assemble(outfile):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(r, "assemble", assemble)
+        with pytest.raises(OSError):
+            r.collect()
+
+        assert os.listdir(media_root / ".resumable") == []
+
+
+class TestSingleChunkUpload:
+    """Tests for collecting one-chunk uploads without merging them."""
+
+    def test_chunk_is_moved_into_place(self, media_root, settings, monkeypatch):
+        settings.ADMIN_RESUMABLE_FILE_HASH = True
+        data = b"foo bar foo bar."
+        r = upload_chunks(data, 100, [1])
+        inode = os.stat(media_root / "16_foo.bar_part_0001").st_ino
+
+        def merge(*args, **kwargs):
+            raise AssertionError("a single chunk must not be merged")
+
+        monkeypatch.setattr(r, "assemble", merge)
+        filename = r.collect()
+
+        assert filename == "16_foo.bar"
+        assert os.listdir(media_root) == ["16_foo.bar"]
+        assert os.stat(media_root / filename).st_ino == inode
+        assert r.sha256 == hashlib.sha256(data).hexdigest()
+
+    def test_existing_name_is_kept(self, media_root):
+        (media_root / "16_foo.bar").write_bytes(b"other")
+        r = upload_chunks(b"foo bar foo bar.", 100, [1])
+
+        filename = r.collect()
+
+        assert filename != "16_foo.bar"
+        assert (media_root / filename).read_bytes() == b"foo bar foo bar."
+        assert (media_root / "16_foo.bar").read_bytes() == b"other"
+
+
+class TestChunkChecksums:
+    """Tests for verifying chunks against the checksums sent by the client."""
+
+    def make_checked_file(self, data, number, chunk_size, checksum):
+        r, chunk = make_resumable_file(data, number, chunk_size)
+        r.params["resumableChunkChecksum"] = checksum
+        return r, chunk
+
+    def test_matching_chunk_is_stored(self, media_root):
+        data = b"foo bar foo bar."
+        r, chunk = self.make_checked_file(
+            data, 1, 10, "md5:" + hashlib.md5(data[:10]).hexdigest()
+        )
+        r.process_chunk(ContentFile(chunk))
+
+        assert r.chunk_sizes == {1: 10}
+
+    @pytest.mark.parametrize("mode", ["parts", "preallocate"])
+    def test_corrupted_chunk_is_rejected(self, media_root, settings, mode):
+        settings.ADMIN_RESUMABLE_CHUNK_MODE = mode
+        data = b"foo bar foo bar."
+        r, chunk = self.make_checked_file(
+            data, 1, 10, "crc32:%08x" % zlib.crc32(data[:10])
+        )
+
+        with pytest.raises(ChunkChecksumError):
+            r.process_chunk(ContentFile(chunk[:9] + b"!"))
+
+        assert not r.chunk_exists
+        assert r.received_chunks == []
+        assert not (media_root / "16_foo.bar_part_0001").exists()
+
+    def test_unsupported_algorithm(self, media_root):
+        r, chunk = self.make_checked_file(b"foo bar foo bar.", 1, 10, "foo:bar")
+
+        with pytest.raises(UnsupportedChecksumError):
+            r.process_chunk(ContentFile(chunk))
+
+
+class TestFileHash:
+    """Tests for computing the SHA-256 of complete files while they are assembled."""
+
+    @pytest.fixture(autouse=True)
+    def hash_file(self, settings):
+        settings.ADMIN_RESUMABLE_FILE_HASH = True
+
+    @pytest.mark.parametrize("mode", ["parts", "preallocate"])
+    def test_hash_of_collected_file(self, media_root, settings, mode):
+        settings.ADMIN_RESUMABLE_CHUNK_MODE = mode
+        data = os.urandom(1000)
+        r = upload_chunks(data, 300, [3, 1, 4, 2])
+
+        r.collect()
+
+        assert r.sha256 == hashlib.sha256(data).hexdigest()
+
+    def test_hashed_files_are_not_merged_in_kernel(self, media_root, monkeypatch):
+        data = os.urandom(1000)
+        r = upload_chunks(data, 300, [1, 2, 3, 4])
+
+        def kernel_copy(*args):
+            raise AssertionError("chunks must pass through the hash")
+
+        monkeypatch.setattr(files, "kernel_copy", kernel_copy)
+        with r.file as outfile:
+            assert outfile.read() == data
+        assert r.sha256 == hashlib.sha256(data).hexdigest()
+
+    def test_no_hash_by_default(self, media_root, settings):
+        settings.ADMIN_RESUMABLE_FILE_HASH = False
+        r = upload_chunks(b"foo bar foo bar.", 5, [1, 2, 3, 4])
+
+        r.collect()
+
+        assert r.sha256 is None
+
+
+class TestPreallocatedMode:
+    """Tests for writing chunks into a single preallocated file."""
+
+    @pytest.fixture(autouse=True)
+    def preallocate(self, settings):
+        settings.ADMIN_RESUMABLE_CHUNK_MODE = "preallocate"
+
+    def test_mode_setting_selects_class(self):
+        assert get_resumable_file_class() is PreallocatedResumableFile
+
+    def test_chunks_are_written_into_one_file(self, media_root):
+        data = os.urandom(1000)
+        r = upload_chunks(data, 300, [4, 2, 1])
+
+        assert sorted(os.listdir(media_root)) == [
+            "1000_foo.bar.bitmap",
+            "1000_foo.bar.data",
+        ]
+        assert os.path.getsize(r.data_path) == 1000
+        assert r.chunk_sizes == {1: 300, 2: 300, 4: 100}
+        assert not r.is_complete
+
+    def test_chunk_exists(self, media_root):
+        data = os.urandom(1000)
+        upload_chunks(data, 300, [2])
+
+        assert make_resumable_file(data, 2, 300)[0].chunk_exists
+        assert not make_resumable_file(data, 3, 300)[0].chunk_exists
+
+    def test_complete_upload_is_moved_into_place(self, media_root):
+        data = os.urandom(1000)
+        r = upload_chunks(data, 300, [3, 1, 4, 2])
+        assert r.is_complete
+        inode = os.stat(r.data_path).st_ino
+
+        filename = r.collect()
+
+        assert filename == "1000_foo.bar"
+        assert sorted(os.listdir(media_root)) == ["1000_foo.bar"]
+        with open(media_root / filename, "rb") as f:
+            assert f.read() == data
+        assert os.stat(media_root / filename).st_ino == inode
+
+    def test_short_chunk_is_not_marked_received(self, media_root):
+        data = os.urandom(1000)
+        r, chunk = make_resumable_file(data, 1, 300)
+        r.process_chunk(ContentFile(chunk[:100]))
+
+        assert not r.chunk_exists
+        assert r.size == 0
+
+    def test_oversized_chunk_does_not_spill_into_next_one(self, media_root):
+        data = os.urandom(1000)
+        upload_chunks(data, 300, [2])
+        r, chunk = make_resumable_file(data, 1, 300)
+        r.process_chunk(ContentFile(chunk + b"x" * 100))
+
+        assert not r.chunk_exists
+        with open(r.data_path, "rb") as f:
+            assert f.read()[:600] == data[:600]
+
+
+class TestAppendMode:
+    """Tests for appending chunks to a single log as they arrive in sequence."""
+
+    @pytest.fixture(autouse=True)
+    def append(self, settings):
+        settings.ADMIN_RESUMABLE_CHUNK_MODE = "append"
+
+    def test_chunks_in_sequence_are_appended(self, media_root):
+        data = os.urandom(1000)
+        r = upload_chunks(data, 300, [1, 2])
+
+        assert sorted(os.listdir(media_root)) == [
+            "1000_foo.bar.log",
+            "1000_foo.bar.log.lock",
+            "1000_foo.bar.manifest",
+            "1000_foo.bar.manifest.received",
+        ]
+        assert (media_root / "1000_foo.bar.log").read_bytes() == data[:600]
+        assert r.received_chunks == [1, 2]
+
+    def test_out_of_order_chunks_are_parked_until_gap_is_filled(self, media_root):
+        data = os.urandom(1000)
+        r = upload_chunks(data, 300, [3, 4, 2])
+        assert sorted(name for name in os.listdir(media_root) if "_part_" in name) == [
+            "1000_foo.bar_part_0002",
+            "1000_foo.bar_part_0003",
+            "1000_foo.bar_part_0004",
+        ]
+        assert (media_root / "1000_foo.bar.log").read_bytes() == b""
+
+        r = upload_chunks(data, 300, [1])
+
+        assert not any("_part_" in name for name in os.listdir(media_root))
+        assert (media_root / "1000_foo.bar.log").read_bytes() == data
+        assert r.is_complete
+
+    def test_partial_append_is_dropped(self, media_root):
+        data = os.urandom(1000)
+        upload_chunks(data, 300, [1])
+        with open(media_root / "1000_foo.bar.log", "ab") as log:
+            log.write(b"died while appending")
+
+        upload_chunks(data, 300, [2])
+
+        assert (media_root / "1000_foo.bar.log").read_bytes() == data[:600]
+
+    def test_complete_upload_is_moved_into_place(self, media_root, settings):
+        settings.ADMIN_RESUMABLE_FILE_HASH = True
+        data = os.urandom(1000)
+        r = upload_chunks(data, 300, [2, 1, 4, 3])
+        inode = os.stat(r.log_path).st_ino
+
+        filename = r.collect()
+
+        assert sorted(os.listdir(media_root)) == [filename]
+        assert os.stat(media_root / filename).st_ino == inode
+        assert (media_root / filename).read_bytes() == data
+        assert r.sha256 == hashlib.sha256(data).hexdigest()
+
+
+class TestShardedLayout:
+    """Tests for storing every upload in its own folder."""
+
+    @pytest.fixture(autouse=True)
+    def sharded(self, settings):
+        settings.ADMIN_RESUMABLE_CHUNK_LAYOUT = "sharded"
+        settings.ADMIN_RESUMABLE_CHUNK_FOLDER = "chunks"
+
+    def test_chunks_are_stored_in_upload_folder(self, media_root):
+        r = upload_chunks(b"foo bar foo bar.", 5, [1, 2])
+
+        assert r.chunk_folder == "chunks/%s/%s" % (r.upload_id[:2], r.upload_id)
+        assert sorted(os.listdir(media_root / r.chunk_folder)) == [
+            "16_foo.bar.manifest",
+            "16_foo.bar.manifest.received",
+            "16_foo.bar_part_0001",
+            "16_foo.bar_part_0002",
+        ]
+
+    def test_uploads_of_different_users_do_not_collide(
+        self, media_root, django_user_model
+    ):
+        data = b"foo bar foo bar."
+        r = upload_chunks(data, 5, [1, 2, 3, 4])
+        user = django_user_model(pk=1, username="other")
+        other = upload_chunks(data, 5, [1], user=user)
+
+        assert other.chunk_folder != r.chunk_folder
+        assert not other.is_complete
+        assert r.is_complete
+
+    def test_upload_folder_is_removed_with_chunks(self, media_root):
+        r = upload_chunks(b"foo bar foo bar.", 5, [1, 2, 3, 4])
+
+        assert r.collect() == "16_foo.bar"
+        assert os.listdir(media_root / "chunks" / r.upload_id[:2]) == []
+
+
+@pytest.mark.django_db
+class TestUploadStateBackends:
+    """Tests for keeping the upload state outside of the chunk storage."""
+
+    @pytest.fixture(
+        autouse=True,
+        params=[
+            "django_resumable_async_upload.states.ModelUploadState",
+            "django_resumable_async_upload.states.CacheUploadState",
+        ],
+    )
+    def backend(self, request, settings):
+        settings.ADMIN_RESUMABLE_STATE_BACKEND = request.param
+        yield
+        cache.clear()
+
+    def test_state_is_not_stored_with_chunks(self, media_root):
+        r = upload_chunks(b"foo bar foo bar.", 5, [2, 1])
+
+        assert r.chunk_sizes == {1: 5, 2: 5}
+        assert r.received_size == 10
+        assert sorted(os.listdir(media_root)) == [
+            "16_foo.bar_part_0001",
+            "16_foo.bar_part_0002",
+        ]
+
+    def test_status_questions_do_not_touch_storage(self, media_root, monkeypatch):
+        data = b"foo bar foo bar."
+        upload_chunks(data, 5, [1, 2, 3])
+        r = make_resumable_file(data, 2, 5)[0]
+
+        def touch(*args, **kwargs):
+            raise AssertionError("chunk storage must not be asked")
+
+        for method in ("exists", "size", "listdir"):
+            monkeypatch.setattr(r.chunk_storage, method, touch)
+        assert r.chunk_exists
+        assert not make_resumable_file(data, 4, 5)[0].chunk_exists
+        assert not r.is_complete
+        assert r.received_chunks == [1, 2, 3]
+
+    def test_complete_upload(self, media_root):
+        data = b"foo bar foo bar."
+        r = upload_chunks(data, 5, [4, 3, 2, 1])
+
+        assert r.is_complete
+        assert r.collect() == "16_foo.bar"
+        assert r.manifest.read() == {}
+        assert sorted(os.listdir(media_root)) == [".resumable", "16_foo.bar"]
+
+
+@pytest.mark.django_db
+class TestStorageFilename:
+    """Tests for loading the instance only when upload_to needs it."""
+
+    @pytest.fixture
+    def foo(self):
+        return Foo.objects.create(bar="bar")
+
+    def make_resumable_file(self, foo):
+        r = make_resumable_file(b"foo bar foo bar.", 1, 16)[0]
+        r.params["instance_id"] = str(foo.pk)
+        return r
+
+    def test_static_upload_to_does_not_query(
+        self, media_root, foo, django_assert_num_queries
+    ):
+        r = self.make_resumable_file(foo)
+
+        with django_assert_num_queries(0):
+            assert r.storage_filename == "16_foo.bar"
+
+    def test_callable_upload_to_gets_instance(self, media_root, foo, monkeypatch):
+        def upload_to(instance, filename):
+            return "%s/%s" % (instance.bar, filename)
+
+        monkeypatch.setattr(Foo._meta.get_field("foo"), "upload_to", upload_to)
+
+        assert self.make_resumable_file(foo).storage_filename == "bar/16_foo.bar"
+
+    def test_upload_to_declares_instance_fields(
+        self, media_root, foo, monkeypatch, django_assert_num_queries
+    ):
+        def upload_to(instance, filename):
+            assert instance.get_deferred_fields() == {"foo", "bat"}
+            return "%s/%s" % (instance.bar, filename)
+
+        upload_to.instance_fields = ["bar"]
+        monkeypatch.setattr(Foo._meta.get_field("foo"), "upload_to", upload_to)
+
+        with django_assert_num_queries(1):
+            assert self.make_resumable_file(foo).storage_filename == "bar/16_foo.bar"
+
+    def test_field_hint_skips_query(
+        self, media_root, foo, monkeypatch, django_assert_num_queries
+    ):
+        def upload_to(instance, filename):
+            return "%d/%s" % (instance.pk, filename)
+
+        field = Foo._meta.get_field("foo")
+        monkeypatch.setattr(field, "upload_to_instance_fields", [])
+        monkeypatch.setattr(field, "upload_to", upload_to)
+
+        with django_assert_num_queries(0):
+            filename = self.make_resumable_file(foo).storage_filename
+        assert filename == "%d/16_foo.bar" % foo.pk
@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+
+import pytest
+
+from django_resumable_async_upload.manifest import LOCK_EX, locked_open
+from django_resumable_async_upload.s3 import MultipartResumableFile
+
+from .test_files import make_resumable_file, upload_chunks
+
+moto = pytest.importorskip("moto")
+boto3 = pytest.importorskip("boto3")
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@pytest.fixture
+def s3(settings, monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    settings.ADMIN_RESUMABLE_CHUNK_MODE = "multipart"
+    settings.ADMIN_RESUMABLE_S3_BUCKET = "uploads"
+    with moto.mock_aws():
+        client = boto3.client("s3")
+        client.create_bucket(Bucket="uploads")
+        yield client
+
+
+class TestMultipartMode:
+    """Tests for passing chunks through to an S3 multipart upload."""
+
+    def test_chunks_are_grouped_into_parts(self, media_root, s3):
+        data = os.urandom(12 * CHUNK_SIZE)
+        r = upload_chunks(data, CHUNK_SIZE, [1, 2, 3, 4])
+        assert r.chunks_per_part == 5
+        assert r.total_parts == 3
+        assert r.uploaded_parts == {}
+
+        r = upload_chunks(data, CHUNK_SIZE, [5])
+
+        assert list(r.uploaded_parts) == [1]
+        assert not any("_part_" in name for name in os.listdir(media_root))
+        assert make_resumable_file(data, 3, CHUNK_SIZE)[0].chunk_exists
+        assert not make_resumable_file(data, 6, CHUNK_SIZE)[0].chunk_exists
+
+    def test_complete_upload_is_assembled_by_s3(self, media_root, s3):
+        data = os.urandom(12 * CHUNK_SIZE)
+        r = upload_chunks(data, CHUNK_SIZE, [12, 11] + list(range(1, 11)))
+        assert r.is_complete
+        assert sorted(r.uploaded_parts) == [1, 2, 3]
+
+        filename = r.collect()
+
+        assert filename == "12582912_foo.bar"
+        body = s3.get_object(Bucket="uploads", Key=filename)["Body"].read()
+        assert body == data
+        assert os.listdir(media_root) == []
+
+    def test_part_with_broken_off_chunk_is_not_sent(self, media_root, s3):
+        data = os.urandom(7 * CHUNK_SIZE)
+        r, chunk = make_resumable_file(data, 5, CHUNK_SIZE)
+        # left behind by a request that broke off while streaming chunk 5
+        (media_root / r.chunk_name(5)).write_bytes(chunk[:100])
+
+        r = upload_chunks(data, CHUNK_SIZE, [1, 2, 3, 4])
+
+        assert r.uploaded_parts == {}
+        assert not make_resumable_file(data, 5, CHUNK_SIZE)[0].chunk_exists
+        r = upload_chunks(data, CHUNK_SIZE, [5])
+        assert list(r.uploaded_parts) == [1]
+
+    def test_collect_sends_missing_parts(self, media_root, s3):
+        data = os.urandom(7 * CHUNK_SIZE)
+        r, _ = make_resumable_file(data, 1, CHUNK_SIZE)
+        with locked_open("%s.2" % r.parts_path, LOCK_EX):
+            # claimed by a request that dies before sending the part
+            r = upload_chunks(data, CHUNK_SIZE, range(1, 8))
+        assert list(r.uploaded_parts) == [1]
+
+        filename = r.collect()
+
+        body = s3.get_object(Bucket="uploads", Key=filename)["Body"].read()
+        assert body == data
+        assert os.listdir(media_root) == []
+
+    def test_collect_waits_for_part_being_sent(self, media_root, s3, monkeypatch):
+        data = os.urandom(7 * CHUNK_SIZE)
+        r, _ = make_resumable_file(data, 1, CHUNK_SIZE)
+        sent = []
+        upload_part = MultipartResumableFile.upload_part
+
+        def record_upload_part(self, part_number):
+            sent.append(part_number)
+            upload_part(self, part_number)
+
+        with locked_open("%s.2" % r.parts_path, LOCK_EX):
+            # another request is sending the last part
+            r = upload_chunks(data, CHUNK_SIZE, range(1, 8))
+            monkeypatch.setattr(
+                MultipartResumableFile, "upload_part", record_upload_part
+            )
+            collector = threading.Thread(target=r.collect)
+            collector.start()
+            time.sleep(0.1)
+            assert collector.is_alive()
+            r.upload_part(2)
+        collector.join()
+
+        assert sent == [2]
+        body = s3.get_object(Bucket="uploads", Key="7340032_foo.bar")["Body"].read()
+        assert body == data
+
+    def test_abort_discards_upload(self, media_root, s3):
+        data = os.urandom(12 * CHUNK_SIZE)
+        r = upload_chunks(data, CHUNK_SIZE, [1, 2, 3, 4, 5, 6])
+
+        r.abort()
+
+        assert s3.list_multipart_uploads(Bucket="uploads").get("Uploads", []) == []
+        assert os.listdir(media_root) == []
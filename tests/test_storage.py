@@ -118,16 +118,32 @@ class TestResumableStorage:
         persistent_storage = storage.get_persistent_storage()
         assert hasattr(persistent_storage, "save")
 
-    def test_multiple_storage_instances_independent(self):
-        """Test that multiple ResumableStorage instances are independent."""
+    def test_storage_instances_are_shared(self):
+        """Test that ResumableStorage instances share the resolved storages."""
         storage1 = ResumableStorage()
         storage2 = ResumableStorage()
 
-        chunk1 = storage1.get_chunk_storage()
-        chunk2 = storage2.get_chunk_storage()
+        assert storage1.get_chunk_storage() is storage2.get_chunk_storage()
+        assert storage1.get_persistent_storage() is storage2.get_persistent_storage()
 
-        # Should be different instances
-        assert chunk1 is not chunk2
+    def test_storage_arguments_create_new_instances(self):
+        """Test that storages created with arguments are not shared."""
+        storage = ResumableStorage()
+
+        chunk_storage = storage.get_chunk_storage(location="/tmp/chunks")
+
+        assert chunk_storage is not storage.get_chunk_storage()
+        assert chunk_storage.location == "/tmp/chunks"
+
+    def test_shared_storages_are_resolved_again_after_settings_change(self, settings):
+        """Test that changing settings drops the shared storages."""
+        chunk_storage = ResumableStorage().get_chunk_storage()
+
+        settings.ADMIN_RESUMABLE_CHUNK_STORAGE = (
+            "django.core.files.storage.FileSystemStorage"
+        )
+
+        assert ResumableStorage().get_chunk_storage() is not chunk_storage
 
     def test_storage_methods_exist(self):
         """Test that storage instances have required methods."""
@@ -29,7 +29,7 @@ def clear_uploads():
 
 
 @pytest.mark.django_db
-def test_fake_file_upload(admin_user, admin_client):
+def test_fake_file_upload(admin_user, admin_client, media_root):
     foo_ct = ContentType.objects.get_for_model(Foo)
     clear_uploads()
 
@@ -87,7 +87,7 @@ def test_fake_file_upload(admin_user, admin_client):
 
 
 @pytest.mark.django_db
-def test_fake_file_upload_incomplete_chunk(admin_user, admin_client):
+def test_fake_file_upload_incomplete_chunk(admin_user, admin_client, media_root):
     foo_ct = ContentType.objects.get_for_model(Foo)
     clear_uploads()
 
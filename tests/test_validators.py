@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+from django.core.exceptions import ValidationError
+from django.core.files.storage import Storage
+
+from django_resumable_async_upload.validators import (
+    StorageFileValidator,
+    record_stored_file,
+    sniff_content_type,
+)
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 100
+
+
+class TestValidateUpload:
+    """Tests for checking uploads before they are complete."""
+
+    def test_content_types_are_sniffed(self):
+        assert sniff_content_type(PNG) == "image/png"
+        assert sniff_content_type(b"%PDF-1.7") == "application/pdf"
+        assert sniff_content_type(b"\0" * 257 + b"ustar") == "application/x-tar"
+        assert sniff_content_type(b"foo bar") == "application/octet-stream"
+
+    def test_accepted_upload(self):
+        validator = StorageFileValidator(
+            max_size=1024, allowed_extensions=[".png"], allowed_types=["image/*"]
+        )
+        validator.validate_upload("foo.png", 1024, PNG)
+
+    @pytest.mark.parametrize(
+        "filename, size, head",
+        [
+            ("foo.exe", 100, None),
+            ("foo.png", 1025, None),
+            ("foo.png", 5, None),
+            ("foo.png", 100, b"MZ\x90\x00"),
+        ],
+    )
+    def test_rejected_upload(self, filename, size, head):
+        validator = StorageFileValidator(
+            min_size=10,
+            max_size=1024,
+            allowed_extensions=[".png"],
+            allowed_types=["image/*"],
+        )
+        with pytest.raises(ValidationError):
+            validator.validate_upload(filename, size, head)
+
+    def test_content_is_not_checked_without_head(self):
+        StorageFileValidator(allowed_types=["image/png"]).validate_upload("foo", 10)
+
+
+class RemoteStorage(Storage):
+    """Storage without local paths, counting its metadata requests."""
+
+    def __init__(self, sizes):
+        self.sizes = sizes
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def size(self, name):
+        with self.lock:
+            self.requests += 1
+        if name not in self.sizes:
+            raise FileNotFoundError(name)
+        return self.sizes[name]
+
+    def exists(self, name):
+        raise AssertionError("size() must be enough")
+
+
+class TestStorageFileValidator:
+    """Tests for validating stored files when the form is saved."""
+
+    def test_local_file(self, media_root):
+        (media_root / "foo.bar").write_bytes(b"foo bar")
+        validator = StorageFileValidator(max_size=10, allowed_extensions=[".bar"])
+
+        validator("foo.bar")
+        with pytest.raises(ValidationError, match="does not exist"):
+            validator("missing.bar")
+        with pytest.raises(ValidationError, match="too small"):
+            StorageFileValidator(min_size=10)("foo.bar")
+
+    def test_one_request_per_file(self, monkeypatch):
+        storage = RemoteStorage({"a.bar": 1, "b.bar": 2, "c.bar": 100})
+        validator = StorageFileValidator(max_size=10)
+        monkeypatch.setattr(validator, "get_storage", lambda: storage)
+
+        with pytest.raises(ValidationError) as e:
+            validator(["a.bar", "b.bar", "c.bar", "d.bar"])
+
+        assert len(e.value.messages) == 2
+        assert storage.requests == 4
+
+    def test_recorded_files_are_not_requested(self, monkeypatch):
+        storage = RemoteStorage({})
+        validator = StorageFileValidator(max_size=10)
+        monkeypatch.setattr(validator, "get_storage", lambda: storage)
+        record_stored_file("recorded.bar", 5)
+
+        validator(["recorded.bar"])
+
+        assert storage.requests == 0
@@ -0,0 +1,625 @@
+import hashlib
+import os
+import threading
+import time
+from urllib.parse import urlencode
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, Client
+
+from django_resumable_async_upload import files, finalizers, handlers
+from django_resumable_async_upload.finalizers import (
+    BaseFinalizer,
+    collect_once,
+    finalize_upload,
+    submit_finalization,
+)
+from django_resumable_async_upload.plans import UploadPlanner
+from django_resumable_async_upload.validators import StorageFileValidator
+
+from .models import Foo
+from .test_files import make_resumable_file, upload_chunks
+
+UPLOAD_URL = "/admin_resumable/upload/"
+CHUNKS_URL = "/admin_resumable/upload/chunks/"
+
+
+def chunk_params(data, chunk_number, chunk_size, filename="foo.bar"):
+    total_chunks = max(1, -(-len(data) // chunk_size))
+    start = (chunk_number - 1) * chunk_size
+    end = len(data) if chunk_number == total_chunks else start + chunk_size
+    params = {
+        "resumableChunkNumber": str(chunk_number),
+        "resumableChunkSize": str(chunk_size),
+        "resumableCurrentChunkSize": str(end - start),
+        "resumableTotalSize": str(len(data)),
+        "resumableTotalChunks": str(total_chunks),
+        "resumableType": "text/plain",
+        "resumableIdentifier": "%d-foobar" % len(data),
+        "resumableFilename": filename,
+        "resumableRelativePath": filename,
+        "content_type_id": str(ContentType.objects.get_for_model(Foo).id),
+        "field_name": "foo",
+    }
+    return params, data[start:end]
+
+
+def post_chunk(
+    client, data, chunk_number, chunk_size, url=UPLOAD_URL, query=False, **kwargs
+):
+    params, chunk = chunk_params(data, chunk_number, chunk_size, **kwargs)
+    if query:
+        # like resumable.js, which sends the params in the query string as well
+        url = "%s?%s" % (url, urlencode(params))
+    params["file"] = SimpleUploadedFile("foo.bar", chunk)
+    return client.post(url, params)
+
+
+async def apost_chunk(client, *args, **kwargs):
+    return await post_chunk(client, *args, **kwargs)
+
+
+async def aget(client, *args, **kwargs):
+    return await client.get(*args, **kwargs)
+
+
+def wait_for_status(client, status_url, timeout=5):
+    deadline = time.monotonic() + timeout
+    while True:
+        status = client.get(status_url).json()
+        if status["state"] in ("done", "failed") or time.monotonic() > deadline:
+            return status
+        time.sleep(0.05)
+
+
+class RecordingFinalizer(BaseFinalizer):
+    """Finalizer standing in for a task queue: serializes the upload and runs it inline."""
+
+    submitted = []
+
+    def submit(self, resumable_file):
+        arguments = self.task_arguments(resumable_file)
+        self.submitted.append(arguments)
+        finalize_upload(*arguments)
+
+
+class QueueingFinalizer(BaseFinalizer):
+    """Finalizer whose queue is never processed."""
+
+    submitted = []
+
+    def submit(self, resumable_file):
+        self.submitted.append(self.task_arguments(resumable_file))
+
+
+@pytest.mark.django_db
+class TestBackgroundFinalization:
+    """Tests for finalizing uploads outside of the request."""
+
+    @pytest.fixture(autouse=True)
+    def background(self, settings):
+        settings.ADMIN_RESUMABLE_BACKGROUND_FINALIZE = True
+
+    def test_complete_upload_returns_202(self, admin_client, media_root):
+        data = b"foo bar foo bar."
+        assert post_chunk(admin_client, data, 1, 10).status_code == 200
+        response = post_chunk(admin_client, data, 2, 10)
+
+        assert response.status_code == 202
+        status_url = response.json()["status_url"]
+        status = wait_for_status(admin_client, status_url)
+        assert status["state"] == "done"
+        assert status["path"] == "16_foo.bar"
+        assert (media_root / "16_foo.bar").read_bytes() == data
+        assert os.listdir(media_root / ".resumable" / "status")
+        assert not (media_root / "status").exists()
+
+    def test_pending_upload_is_submitted_once(self, admin_client, media_root, settings):
+        settings.ADMIN_RESUMABLE_FINALIZER = "tests.test_views.QueueingFinalizer"
+        QueueingFinalizer.submitted = []
+        data = b"foo bar foo bar."
+        first = post_chunk(admin_client, data, 1, 16)
+        second = admin_client.get(UPLOAD_URL, chunk_params(data, 1, 16)[0])
+
+        assert first.status_code == second.status_code == 202
+        assert len(QueueingFinalizer.submitted) == 1
+        assert admin_client.get(first.json()["status_url"]).json()["state"] == "pending"
+
+    def test_custom_finalizer(self, admin_client, media_root, settings):
+        settings.ADMIN_RESUMABLE_FINALIZER = "tests.test_views.RecordingFinalizer"
+        RecordingFinalizer.submitted = []
+        data = b"foo bar foo bar."
+        response = post_chunk(admin_client, data, 1, 16)
+
+        assert len(RecordingFinalizer.submitted) == 1
+        status = admin_client.get(response.json()["status_url"]).json()
+        assert status["state"] == "done"
+        assert (media_root / status["path"]).read_bytes() == data
+
+    def test_status_of_unknown_upload(self, admin_client, media_root):
+        response = admin_client.get("/admin_resumable/upload/status/%s/" % ("0" * 40))
+        assert response.status_code == 404
+
+    def test_status_of_other_users_upload(
+        self, admin_client, client, django_user_model, media_root
+    ):
+        data = b"foo bar foo bar."
+        status_url = post_chunk(admin_client, data, 1, 16).json()["status_url"]
+        wait_for_status(admin_client, status_url)
+
+        user = django_user_model.objects.create_user("other", password="password")
+        client.force_login(user)
+        assert client.get(status_url).status_code == 404
+
+
+def run_concurrently(func, count):
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(i):
+        barrier.wait()
+        results[i] = func()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestExactlyOnceFinalization:
+    """Tests for finalizing an upload completed by several concurrent requests."""
+
+    @pytest.mark.parametrize("local_lock", [True, False])
+    def test_upload_is_collected_once(self, media_root, monkeypatch, local_lock):
+        if not local_lock:
+            # locked in the cache, like on remote chunk storage
+            monkeypatch.setattr(finalizers, "get_local_path", lambda *args: None)
+        data = b"foo bar foo bar."
+        upload_chunks(data, 5, [1, 2, 3, 4])
+        collected = []
+        collect = files.ResumableFile.collect
+
+        def slow_collect(self):
+            collected.append(self)
+            time.sleep(0.1)
+            return collect(self)
+
+        monkeypatch.setattr(files.ResumableFile, "collect", slow_collect)
+        paths = run_concurrently(
+            lambda: collect_once(make_resumable_file(data, 4, 5)[0]), 4
+        )
+
+        assert len(collected) == 1
+        assert paths == ["16_foo.bar"] * 4
+        assert (media_root / "16_foo.bar").read_bytes() == data
+        assert not os.path.exists(media_root / "16_foo_1.bar")
+        # no status is kept for uploads collected in the request
+        assert not list(media_root.glob(".resumable/status/*.json"))
+
+    def test_late_request_gets_path_without_cache(self, media_root):
+        data = b"foo bar foo bar."
+        upload_chunks(data, 16, [1])
+        assert collect_once(make_resumable_file(data, 1, 16)[0]) == "16_foo.bar"
+        # e.g. another worker with its own local memory cache
+        cache.clear()
+
+        assert collect_once(make_resumable_file(data, 1, 16)[0]) == "16_foo.bar"
+
+    def test_new_upload_of_same_file_is_collected(self, media_root):
+        data = b"foo bar foo bar."
+        upload_chunks(data, 16, [1])
+        assert collect_once(make_resumable_file(data, 1, 16)[0]) == "16_foo.bar"
+
+        upload_chunks(data, 16, [1])
+        path = collect_once(make_resumable_file(data, 1, 16)[0])
+        assert path != "16_foo.bar"
+        assert (media_root / path).read_bytes() == data
+
+    @pytest.mark.django_db
+    def test_upload_is_submitted_once(self, media_root, settings):
+        settings.ADMIN_RESUMABLE_FINALIZER = "tests.test_views.QueueingFinalizer"
+        QueueingFinalizer.submitted = []
+        data = b"foo bar foo bar."
+        upload_chunks(data, 5, [1, 2, 3, 4])
+
+        statuses = run_concurrently(
+            lambda: submit_finalization(make_resumable_file(data, 4, 5)[0]), 4
+        )
+
+        assert len(QueueingFinalizer.submitted) == 1
+        assert [status["state"] for status in statuses] == ["pending"] * 4
+
+
+@pytest.mark.django_db(transaction=True)
+class TestAsyncUploadView:
+    """Tests for the native async upload view."""
+
+    url = "/admin_resumable/upload/async/"
+
+    @pytest.fixture
+    def async_client(self, admin_user):
+        client = AsyncClient()
+        client.force_login(admin_user)
+        return client
+
+    def test_upload(self, async_client, media_root):
+        data = b"foo bar foo bar."
+        post = async_to_sync(apost_chunk)
+
+        response = post(async_client, data, 1, 10, url=self.url)
+        assert response.status_code == 200
+        assert response.content == b"chunk uploaded"
+
+        response = post(async_client, data, 2, 10, url=self.url)
+        assert response.status_code == 200
+        assert response.content == b"16_foo.bar"
+        assert (media_root / "16_foo.bar").read_bytes() == data
+
+    def test_chunk_test(self, async_client, media_root):
+        data = b"foo bar foo bar."
+        get = async_to_sync(aget)
+
+        response = get(async_client, self.url, chunk_params(data, 1, 10)[0])
+        assert response.status_code == 204
+
+        async_to_sync(apost_chunk)(async_client, data, 1, 10, url=self.url)
+        response = get(async_client, self.url, chunk_params(data, 1, 10)[0])
+        assert response.status_code == 200
+        assert response.content == b"chunk exists"
+
+    def test_login_required(self, media_root):
+        response = async_to_sync(aget)(AsyncClient(), self.url)
+        assert response.status_code == 302
+
+
+@pytest.mark.django_db
+class TestOctetStreamUpload:
+    """Tests for chunks sent as raw application/octet-stream bodies."""
+
+    def post_octet_chunk(self, client, data, chunk_number, chunk_size):
+        params, chunk = chunk_params(data, chunk_number, chunk_size)
+        return client.post(
+            "%s?%s" % (UPLOAD_URL, urlencode(params)),
+            data=chunk,
+            content_type="application/octet-stream",
+        )
+
+    def test_upload(self, admin_client, media_root):
+        data = b"foo bar foo bar."
+
+        response = self.post_octet_chunk(admin_client, data, 2, 10)
+        assert response.content == b"chunk uploaded"
+        assert (media_root / "16_foo.bar_part_0002").read_bytes() == data[10:]
+
+        response = self.post_octet_chunk(admin_client, data, 1, 10)
+        assert response.status_code == 200
+        assert response.content == b"16_foo.bar"
+        assert (media_root / "16_foo.bar").read_bytes() == data
+
+    def test_body_is_not_parsed_as_multipart(
+        self, admin_client, media_root, monkeypatch
+    ):
+        data = b"foo bar foo bar."
+
+        def parse(*args, **kwargs):
+            raise AssertionError("octet-stream chunks must not be parsed")
+
+        monkeypatch.setattr("django.http.request.MultiPartParser", parse)
+        response = self.post_octet_chunk(admin_client, data, 1, 16)
+        assert response.status_code == 200
+        assert (media_root / "16_foo.bar").read_bytes() == data
+
+
+@pytest.mark.django_db
+class TestChunkUploadHandler:
+    """Tests for writing multipart chunks to disk only once."""
+
+    @pytest.fixture(autouse=True)
+    def spool_to_disk(self, settings, tmp_path):
+        settings.FILE_UPLOAD_MAX_MEMORY_SIZE = 1
+        # spooling to the default temp dir would fail
+        settings.FILE_UPLOAD_TEMP_DIR = str(tmp_path / "missing")
+
+    def test_chunk_is_spooled_in_chunk_folder(self, admin_client, media_root, settings):
+        settings.ADMIN_RESUMABLE_CHUNK_FOLDER = "chunks"
+        data = b"foo bar foo bar."
+
+        response = post_chunk(admin_client, data, 1, 10, query=True)
+        assert response.status_code == 200
+        assert sorted(os.listdir(media_root / "chunks")) == [
+            "16_foo.bar.manifest",
+            "16_foo.bar.manifest.received",
+            "16_foo.bar_part_0001",
+        ]
+
+        response = post_chunk(admin_client, data, 2, 10)
+        assert response.content == b"16_foo.bar"
+        assert (media_root / "16_foo.bar").read_bytes() == data
+
+    def test_chunk_is_written_into_preallocated_file(
+        self, admin_client, media_root, settings, monkeypatch
+    ):
+        settings.ADMIN_RESUMABLE_CHUNK_MODE = "preallocate"
+        data = b"foo bar foo bar."
+
+        def open_temporary_file(*args, **kwargs):
+            raise AssertionError("chunk must be written in place")
+
+        monkeypatch.setattr(handlers, "ChunkTemporaryUploadedFile", open_temporary_file)
+        response = post_chunk(admin_client, data, 2, 10, query=True)
+        assert response.content == b"chunk uploaded"
+        assert (media_root / "16_foo.bar.data").read_bytes()[10:] == data[10:]
+
+        response = post_chunk(admin_client, data, 1, 10, query=True)
+        assert response.content == b"16_foo.bar"
+        assert (media_root / "16_foo.bar").read_bytes() == data
+
+    def test_received_chunk_is_not_overwritten(
+        self, admin_client, media_root, settings
+    ):
+        settings.ADMIN_RESUMABLE_CHUNK_MODE = "preallocate"
+        data = b"foo bar foo bar."
+        params, chunk = chunk_params(data, 1, 10)
+        url = "%s?%s" % (UPLOAD_URL, urlencode(params))
+        params["file"] = SimpleUploadedFile("foo.bar", chunk)
+        assert admin_client.post(url, params).content == b"chunk uploaded"
+
+        params["file"] = SimpleUploadedFile("foo.bar", b"x" * 10)
+        assert admin_client.post(url, params).content == b"chunk uploaded"
+        assert (media_root / "16_foo.bar.data").read_bytes()[:10] == chunk
+
+    @pytest.mark.parametrize("mode", ["parts", "preallocate"])
+    def test_chunk_checksum_is_verified_while_spooling(
+        self, admin_client, media_root, settings, mode
+    ):
+        settings.ADMIN_RESUMABLE_CHUNK_MODE = mode
+        settings.ADMIN_RESUMABLE_FILE_HASH = True
+        data = b"foo bar foo bar."
+        params, chunk = chunk_params(data, 1, 16)
+        params["resumableChunkChecksum"] = "md5:" + hashlib.md5(chunk).hexdigest()
+        url = "%s?%s" % (UPLOAD_URL, urlencode(params))
+
+        params["file"] = SimpleUploadedFile("foo.bar", b"corrupted chunk.")
+        response = admin_client.post(url, params)
+        assert response.status_code == 422
+        assert not (media_root / "16_foo.bar").exists()
+
+        params["file"] = SimpleUploadedFile("foo.bar", chunk)
+        response = admin_client.post(url, params)
+        assert response.content == b"16_foo.bar"
+        assert (media_root / "16_foo.bar").read_bytes() == data
+
+    def test_csrf_is_enforced(self, admin_user, media_root):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(admin_user)
+
+        response = post_chunk(client, b"foo bar foo bar.", 1, 16, query=True)
+        assert response.status_code == 403
+
+
+@pytest.mark.django_db
+class TestUploadChunksView:
+    """Tests for listing the stored chunks of an upload in one request."""
+
+    def test_received_chunks_are_listed_as_ranges(self, admin_client, media_root):
+        data = b"foo bar foo bar foo bar foo bar."
+        for number in (1, 2, 4, 6, 7):
+            post_chunk(admin_client, data, number, 4)
+
+        response = admin_client.get(CHUNKS_URL, chunk_params(data, 1, 4)[0])
+
+        assert response.json() == {
+            "total_chunks": 8,
+            "received": [[1, 2], [4, 4], [6, 7]],
+        }
+
+    def test_short_chunks_are_not_listed(self, admin_client, media_root):
+        data = b"foo bar foo bar."
+        r, chunk = make_resumable_file(data, 2, 5)
+        r.process_chunk(ContentFile(chunk[:2]))
+        post_chunk(admin_client, data, 1, 5)
+
+        response = admin_client.get(CHUNKS_URL, chunk_params(data, 1, 5)[0])
+
+        assert response.json()["received"] == [[1, 1]]
+
+    def test_chunks_are_not_stat_ed(self, admin_client, media_root, monkeypatch):
+        data = b"foo bar foo bar."
+        post_chunk(admin_client, data, 1, 5)
+
+        def size(*args, **kwargs):
+            raise AssertionError("chunks must not be stat-ed")
+
+        monkeypatch.setattr("django.core.files.storage.FileSystemStorage.size", size)
+        response = admin_client.get(CHUNKS_URL, chunk_params(data, 1, 5)[0])
+
+        assert response.json()["received"] == [[1, 1]]
+
+
+@pytest.mark.django_db
+class TestUploadPlanView:
+    """Tests for planning an upload before sending its chunks."""
+
+    PLAN_URL = "/admin_resumable/upload/plan/"
+
+    def get_plan(self, client, data, chunk_size=1024):
+        return client.get(self.PLAN_URL, chunk_params(data, 1, chunk_size)[0]).json()
+
+    def test_plan_of_new_upload(self, admin_client, media_root, settings):
+        settings.ADMIN_RESUMABLE_CHUNKSIZE = "4*1024"
+        settings.ADMIN_SIMULTANEOUS_UPLOADS = 2
+        data = os.urandom(10 * 1024)
+
+        plan = self.get_plan(admin_client, data)
+
+        assert len(plan["upload_id"]) == 40
+        assert plan["chunk_size"] == 4096
+        assert 1 <= plan["simultaneous_uploads"] <= 2
+        assert plan["total_chunks"] == 2
+        assert plan["received"] == []
+
+    def test_huge_files_get_bigger_chunks(self, admin_client, media_root, settings):
+        settings.ADMIN_RESUMABLE_CHUNKSIZE = 1024
+        settings.ADMIN_RESUMABLE_MAX_CHUNKS = 4
+        data = os.urandom(10 * 1024)
+
+        assert self.get_plan(admin_client, data)["chunk_size"] == 3 * 1024
+
+        settings.ADMIN_RESUMABLE_MAX_CHUNKSIZE = 2 * 1024
+        assert self.get_plan(admin_client, data)["chunk_size"] == 2 * 1024
+
+    def test_plan_lists_received_chunks(self, admin_client, media_root, settings):
+        settings.ADMIN_RESUMABLE_CHUNKSIZE = 1024
+        data = os.urandom(4 * 1024)
+        post_chunk(admin_client, data, 1, 1024)
+        post_chunk(admin_client, data, 3, 1024)
+
+        assert self.get_plan(admin_client, data)["received"] == [[1, 1], [3, 3]]
+
+    def test_parallelism_drops_under_load(self, settings, monkeypatch):
+        settings.ADMIN_SIMULTANEOUS_UPLOADS = 4
+        monkeypatch.setattr(os, "cpu_count", lambda: 2)
+        monkeypatch.setattr(os, "getloadavg", lambda: (1.0, 1.0, 1.0))
+        assert UploadPlanner().simultaneous_uploads() == 4
+
+        monkeypatch.setattr(os, "getloadavg", lambda: (8.0, 1.0, 1.0))
+        assert UploadPlanner().simultaneous_uploads() == 1
+
+
+@pytest.mark.django_db
+class TestDeduplication:
+    """Tests for skipping uploads of content already in persistent storage."""
+
+    PLAN_URL = "/admin_resumable/upload/plan/"
+
+    @pytest.fixture(autouse=True)
+    def dedup(self, settings):
+        settings.ADMIN_RESUMABLE_DEDUP = True
+
+    def get_plan(self, client, data, filename="foo.bar"):
+        params = chunk_params(data, 1, 1024, filename=filename)[0]
+        params["resumableSha256"] = hashlib.sha256(data).hexdigest()
+        return client.get(self.PLAN_URL, params).json()
+
+    def upload(self, client, data):
+        for number in range(1, len(data) // 1024 + 1):
+            response = post_chunk(client, data, number, 1024)
+        return response.content.decode()
+
+    def test_known_content_is_copied(self, admin_client, media_root):
+        data = os.urandom(3 * 1024)
+        assert "path" not in self.get_plan(admin_client, data)
+        self.upload(admin_client, data)
+
+        plan = self.get_plan(admin_client, data, filename="copy.bar")
+
+        assert plan["path"] == "3072_copy.bar"
+        assert "chunk_size" not in plan
+        assert (media_root / "3072_copy.bar").read_bytes() == data
+
+    def test_reference_mode(self, admin_client, media_root, settings):
+        settings.ADMIN_RESUMABLE_DEDUP_MODE = "reference"
+        data = os.urandom(3 * 1024)
+        path = self.upload(admin_client, data)
+
+        plan = self.get_plan(admin_client, data, filename="copy.bar")
+
+        assert plan["path"] == path
+        assert "chunk_size" not in plan
+
+    def test_referenced_file_is_not_deleted(self, admin_client, media_root, settings):
+        settings.ADMIN_RESUMABLE_DEDUP_MODE = "reference"
+        data = os.urandom(3 * 1024)
+        path = self.upload(admin_client, data)
+        self.get_plan(admin_client, data, filename="copy.bar")
+
+        response = admin_client.delete(
+            UPLOAD_URL, {"file_path": path}, content_type="application/json"
+        )
+
+        assert response.status_code == 200
+        assert (media_root / path).read_bytes() == data
+
+    def test_deleted_files_are_dropped_from_index(self, admin_client, media_root):
+        data = os.urandom(3 * 1024)
+        path = self.upload(admin_client, data)
+        os.remove(media_root / path)
+
+        assert "path" not in self.get_plan(admin_client, data)
+        shard = hashlib.sha256(data).hexdigest()[:2]
+        assert os.listdir(media_root / ".resumable" / "index" / shard) == []
+
+
+@pytest.mark.django_db
+class TestEarlyRejection:
+    """Tests for rejecting uploads by the field's validators before they are complete."""
+
+    @pytest.fixture(autouse=True)
+    def validator(self, monkeypatch):
+        validator = StorageFileValidator(
+            max_size=1024, allowed_extensions=[".bar"], allowed_types=["image/*"]
+        )
+        field = Foo._meta.get_field("foo")
+        monkeypatch.setitem(field.__dict__, "validators", [validator])
+
+    def test_plan_rejects_upload(self, admin_client, media_root):
+        params = chunk_params(os.urandom(2048), 1, 1024)[0]
+
+        response = admin_client.get("/admin_resumable/upload/plan/", params)
+
+        assert response.status_code == 415
+        assert "too large" in response.json()["error"]
+
+    def test_first_chunk_is_sniffed(self, admin_client, media_root):
+        data = b"MZ" + os.urandom(1000)
+        post_chunk(admin_client, data, 2, 500)
+
+        response = post_chunk(admin_client, data, 1, 500, query=True)
+
+        assert response.status_code == 415
+        assert os.listdir(media_root) == []
+
+    @pytest.mark.parametrize("content_type", ["multipart", "octet-stream"])
+    def test_chunk_is_rejected_before_it_is_written(
+        self, admin_client, media_root, settings, monkeypatch, content_type
+    ):
+        settings.ADMIN_RESUMABLE_CHUNK_MODE = "preallocate"
+
+        def open_chunk(*args, **kwargs):
+            raise AssertionError("rejected chunks must not be written")
+
+        monkeypatch.setattr(files.PreallocatedResumableFile, "open_chunk", open_chunk)
+        params, chunk = chunk_params(os.urandom(2048), 2, 1024)
+        url = "%s?%s" % (UPLOAD_URL, urlencode(params))
+
+        if content_type == "multipart":
+            params["file"] = SimpleUploadedFile("foo.bar", chunk)
+            response = admin_client.post(url, params)
+        else:
+            response = admin_client.post(
+                url, data=chunk, content_type="application/octet-stream"
+            )
+
+        assert response.status_code == 415
+        assert "too large" in response.content.decode()
+        assert os.listdir(media_root) == []
+
+    def test_octet_stream_chunk_is_sniffed(self, admin_client, media_root):
+        data = b"\x89PNG\r\n\x1a\n" + os.urandom(1000)
+        params, chunk = chunk_params(data, 1, 1008)
+
+        response = admin_client.post(
+            "%s?%s" % (UPLOAD_URL, urlencode(params)),
+            data=chunk,
+            content_type="application/octet-stream",
+        )
+
+        assert response.content == b"1008_foo.bar"
+        assert (media_root / "1008_foo.bar").read_bytes() == data